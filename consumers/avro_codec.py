@@ -0,0 +1,71 @@
+"""Decodes Avro records in the Confluent wire format with fastavro.
+
+Writer schemas are fetched from the schema registry and parsed once per registry id, and shared by
+every consumer of the process.
+"""
+import io
+import json
+import struct
+
+from os import environ
+from typing import Optional
+
+from confluent_kafka.avro import CachedSchemaRegistryClient
+from confluent_kafka.avro.serializer import SerializerError
+from fastavro import parse_schema, schemaless_reader
+
+
+MAGIC_BYTE = 0
+
+_HEADER = struct.Struct(">bI")
+
+_schema_registry: Optional[CachedSchemaRegistryClient] = None
+# registry id -> parsed writer schema
+_schemas: dict[int, dict] = {}
+
+
+def _writer_schema(schema_id):
+    """Returns the parsed schema registered with the given id"""
+    global _schema_registry
+
+    parsed_schema = _schemas.get(schema_id)
+    if parsed_schema is None:
+        if _schema_registry is None:
+            _schema_registry = CachedSchemaRegistryClient(environ.get("SCHEMA_REGISTRY_URL") or "http://localhost:8081")
+        schema = _schema_registry.get_by_id(schema_id)
+        if schema is None:
+            raise SerializerError(f"unable to fetch schema with id {schema_id}")
+        parsed_schema = parse_schema(json.loads(str(schema)))
+        _schemas[schema_id] = parsed_schema
+
+    return parsed_schema
+
+
+def decode(data):
+    """Decodes a record encoded in the Confluent wire format"""
+    if data is None:
+        return None
+
+    if len(data) <= _HEADER.size:
+        raise SerializerError("message is too small to decode")
+
+    magic, schema_id = _HEADER.unpack_from(data)
+    if magic != MAGIC_BYTE:
+        raise SerializerError("message does not start with magic byte")
+
+    buffer = io.BytesIO(data)
+    buffer.seek(_HEADER.size)
+    return schemaless_reader(buffer, _writer_schema(schema_id))
+
+
+def decode_message(message):
+    """Replaces the key and value of a consumed message with their decoded records"""
+    try:
+        message.set_key(decode(message.key()))
+        message.set_value(decode(message.value()))
+    except SerializerError as e:
+        raise SerializerError(
+            f"Message deserialization failed for message at {message.topic()} [{message.partition()}] "
+            f"offset {message.offset()}: {e}"
+        )
+    return message
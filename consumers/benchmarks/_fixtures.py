@@ -0,0 +1,76 @@
+"""Messages and models shared by the benchmarks that feed the consumer models directly"""
+import csv
+import json
+import random
+
+from pathlib import Path
+
+
+STATIONS_PATH = Path(__file__).parents[2] / "producers" / "data" / "cta_stations.csv"
+
+TRANSFORMED_STATIONS_TOPIC = "com.udacity.nd029.p1.v1.transformedstations"
+
+
+class Message:
+    """Stands in for a Kafka message, with the value already decoded like the consumer does"""
+
+    def __init__(self, topic, value):
+        self._topic = topic
+        self._value = value
+
+    def topic(self):
+        return self._topic
+
+    def value(self):
+        return self._value
+
+
+def transformed_stations() -> list[dict]:
+    """Returns the stations of cta_stations.csv as Faust transforms them"""
+    with open(STATIONS_PATH, newline="", encoding="utf-8") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+
+    stations = []
+    for row in rows:
+        # Same mapping as faust_stream.py
+        flags = tuple(row[color] == "TRUE" for color in ("red", "blue", "green"))
+        color = {(True, False, False): "red", (False, True, False): "blue", (False, False, True): "green"}.get(
+            flags, "unknown"
+        )
+        stations.append({
+            "station_id": int(row["station_id"]),
+            "station_name": row["station_name"],
+            "order": int(row["order"]),
+            "line": color
+        })
+    return stations
+
+
+def load_lines(lines) -> dict[int, str]:
+    """Adds the transformed stations to a Lines model. Returns the line of every station id"""
+    station_lines = {}
+    for station in transformed_stations():
+        station_lines[station["station_id"]] = station["line"]
+        lines.process_message(Message(TRANSFORMED_STATIONS_TOPIC, json.dumps(station)))
+    return station_lines
+
+
+def random_message(rng: random.Random, station_lines: dict[int, str], station_ids: list[int]) -> Message:
+    """Returns an arrival or a turnstile summary at one of station_ids, picked at random"""
+    station_id = rng.choice(station_ids)
+    if rng.random() < 0.5:
+        return Message("com.udacity.nd029.p1.v1.arrivals", {
+            "station_id": station_id,
+            "train_id": f"{station_lines[station_id].upper()}L{rng.randrange(10):03d}",
+            "direction": rng.choice("ab"),
+            "line": station_lines[station_id],
+            "train_status": "in_service",
+            "prev_station_id": rng.choice(station_ids),
+            "prev_direction": rng.choice("ab")
+        })
+    return Message("TURNSTILE_SUMMARY", json.dumps({"STATION_ID": station_id, "COUNT": rng.randrange(1000)}))
+
+
+def random_change(lines, rng: random.Random, station_lines: dict[int, str], station_ids: list[int]):
+    """Applies a random_message to a Lines model"""
+    lines.process_message(random_message(rng, station_lines, station_ids))
@@ -0,0 +1,149 @@
+"""Compares the consume loops of KafkaConsumer: polling a message at a time on the IOLoop ("poll"),
+fetching batches on the IOLoop with the adaptive idle sleep ("batch"), and fetching batches from a
+dedicated polling thread ("thread").
+
+It runs against the mock cluster built into librdkafka, so the Kafka stack is not needed. Every
+mode is measured twice, on its own topic: "throughput" consumes a backlog of messages, prefetched
+by librdkafka, as fast as possible, and "latency" receives messages at a steady, light rate and
+reports how long they wait before being handled, which includes the time the broker holds fetch
+requests. Run from the consumers directory:
+
+    python -m benchmarks.consume --messages 100000 --modes poll,batch,thread --batch-size 500
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from os import environ
+
+from confluent_kafka import Producer
+
+
+# Constructor arguments of KafkaConsumer for each mode, besides the batch size
+_MODES = {
+    "poll": {"poll_thread": False},
+    "batch": {"poll_thread": False},
+    "thread": {"poll_thread": True},
+}
+
+_PADDING = "x" * 150
+
+# Seconds the first handled message of the throughput run blocks the IOLoop, so every loop starts
+# with the backlog prefetched by librdkafka. Otherwise the loops that back off while they wait for
+# the partitions to be assigned start with it prefetched, and the others with a cold fetch
+_WARMUP_SECS = 1.0
+
+
+def _mock_cluster() -> tuple[Producer, str]:
+    """Starts a mock cluster owned by the returned producer. Returns it with the bootstrap servers
+    other clients connect to"""
+    producer = Producer({"test.mock.num.brokers": 1, "linger.ms": 0})
+    brokers = producer.list_topics(timeout=10).brokers.values()
+    return producer, ",".join(f"{broker.host}:{broker.port}" for broker in brokers)
+
+
+def _value() -> bytes:
+    return json.dumps({"sent": time.time(), "padding": _PADDING}).encode("utf-8")
+
+
+async def _consume_until(consumer, done: asyncio.Event):
+    task = asyncio.create_task(consumer.consume())
+    await done.wait()
+    task.cancel()
+    consumer.close()
+
+
+async def _throughput(producer: Producer, topic: str, consumer_args: dict, num_messages: int) -> dict:
+    from consumer import KafkaConsumer
+
+    for _ in range(num_messages):
+        while True:
+            try:
+                producer.produce(topic, value=_value())
+                break
+            except BufferError:
+                producer.poll(0.1)
+    producer.flush()
+
+    done = asyncio.Event()
+    times = []
+
+    def handle(message):
+        if not times:
+            time.sleep(_WARMUP_SECS)
+        times.append(time.perf_counter())
+        if len(times) == num_messages:
+            done.set()
+
+    consumer = KafkaConsumer(topic, handle, is_avro=False, offset_earliest=True, **consumer_args)
+    await _consume_until(consumer, done)
+
+    # Measured from the first message, so joining the group and the warm up are left out
+    return {"messages": num_messages, "messages_per_second": (num_messages - 1) / (times[-1] - times[0])}
+
+
+async def _latency(producer: Producer, topic: str, consumer_args: dict, num_messages: int, rate: float) -> dict:
+    from consumer import KafkaConsumer
+
+    done = asyncio.Event()
+    latencies = []
+
+    def handle(message):
+        sent = json.loads(message.value()).get("sent")
+        if sent is None:
+            return
+        latencies.append(time.time() - sent)
+        if len(latencies) == num_messages:
+            done.set()
+
+    consumer = KafkaConsumer(topic, handle, is_avro=False, offset_earliest=True, **consumer_args)
+
+    async def produce():
+        # The topic is created by the first message, then the consumer gets time to join
+        producer.produce(topic, value=b"{}")
+        producer.flush()
+        await asyncio.sleep(5.0)
+        latencies.clear()
+        for _ in range(num_messages):
+            producer.produce(topic, value=_value())
+            producer.poll(0)
+            await asyncio.sleep(1.0 / rate)
+
+    await asyncio.gather(produce(), _consume_until(consumer, done))
+
+    latencies.sort()
+    return {
+        "latency_mean_ms": 1000 * sum(latencies) / len(latencies),
+        "latency_p95_ms": 1000 * latencies[int(len(latencies) * 0.95)],
+    }
+
+
+async def _run(args):
+    producer, bootstrap_servers = _mock_cluster()
+    # Read by KafkaConsumer
+    environ["BROKER_URL"] = bootstrap_servers
+
+    for mode in args.modes.split(","):
+        consumer_args = {**_MODES[mode], "batch_size": 1 if mode == "poll" else args.batch_size}
+        throughput = await _throughput(producer, f"benchmark.throughput.{mode}", consumer_args, args.messages)
+        latency = await _latency(
+            producer, f"benchmark.latency.{mode}", consumer_args, args.latency_messages, args.latency_rate
+        )
+        print(json.dumps({"mode": mode, "batch_size": consumer_args["batch_size"], **throughput, **latency}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000, help="Messages consumed by the throughput run")
+    parser.add_argument("--modes", default="poll,batch,thread", help="Comma separated consume loops")
+    parser.add_argument("--batch-size", type=int, default=500, help="Batch size of the batch and thread loops")
+    parser.add_argument("--latency-messages", type=int, default=100, help="Messages received by the latency run")
+    parser.add_argument("--latency-rate", type=float, default=20.0, help="Messages per second of the latency run")
+    args = parser.parse_args()
+
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Measures the bandwidth of the live updates of the status page, compared with reloading the page
+every 10 seconds as its meta refresh did.
+
+The server runs the Lines and Weather models with the stations of producers/data/cta_stations.csv,
+and applies --changes arrivals and turnstile summaries per second at random stations. --clients
+WebSocket clients, run by another process, receive the updates of /live for --duration seconds.
+They offer permessage-deflate like browsers do, which the server accepts when --compression is
+given. The bytes they read from their sockets are counted. Run from the consumers directory:
+
+    python -m benchmarks.live_updates --clients 1000 --changes 200 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import subprocess
+import sys
+import time
+
+from benchmarks._fixtures import load_lines, random_change
+
+
+# Seconds between reloads of the page before the live updates
+_REFRESH_SECS = 10.0
+
+
+def _raise_open_files_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+async def _run_clients(url: str, num_clients: int, duration: float) -> dict:
+    from tornado.iostream import IOStream
+    from tornado.websocket import websocket_connect
+
+    received = {"messages": 0, "bytes": 0}
+    counting = set()
+
+    # Counts the bytes read from the sockets, which are compressed when the server accepts it
+    read_from_fd = IOStream.read_from_fd
+
+    def counted_read_from_fd(stream, buf):
+        num_bytes = read_from_fd(stream, buf)
+        if num_bytes and stream in counting:
+            received["bytes"] += num_bytes
+        return num_bytes
+
+    IOStream.read_from_fd = counted_read_from_fd
+
+    async def client():
+        # Offers permessage-deflate like browsers do
+        connection = await websocket_connect(url, compression_options={})
+        # The snapshot sent on connection is left out
+        await connection.read_message()
+        counting.add(connection.stream)
+        end = time.monotonic() + duration
+        while time.monotonic() < end:
+            message = await connection.read_message()
+            if message is None:
+                break
+            received["messages"] += 1
+        counting.discard(connection.stream)
+        connection.close()
+
+    await asyncio.gather(*(client() for _ in range(num_clients)))
+    return received
+
+
+async def _run_server(args) -> dict:
+    import tornado.httpserver
+    import tornado.netutil
+    import tornado.web
+
+    from models import Lines, Weather
+    from server import LiveHandler, LiveUpdates, MainHandler, StatusPage
+
+    weather = Weather()
+    lines = Lines()
+    station_lines = load_lines(lines)
+    station_ids = sorted(station_lines)
+
+    # Times the flushes, which have to stay well under --flush-secs for the updates to keep up
+    flush_seconds = []
+
+    class TimedLiveUpdates(LiveUpdates):
+        def flush(self):
+            flush_start = time.perf_counter()
+            super().flush()
+            flush_seconds.append(time.perf_counter() - flush_start)
+
+    page = StatusPage(weather, lines)
+    live = TimedLiveUpdates(weather, lines, flush_secs=args.flush_secs, compression=args.compression)
+    application = tornado.web.Application([
+        (r"/", MainHandler, {"page": page}),
+        (r"/live", LiveHandler, {"live": live}),
+    ])
+    sockets = tornado.netutil.bind_sockets(0, "127.0.0.1")
+    server = tornado.httpserver.HTTPServer(application)
+    server.add_sockets(sockets)
+    port = sockets[0].getsockname()[1]
+    live.start()
+
+    clients = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "benchmarks.live_updates", "--run-clients", f"ws://127.0.0.1:{port}/live",
+        "--clients", str(args.clients), "--duration", str(args.duration),
+        stdout=subprocess.PIPE
+    )
+    communicate = asyncio.create_task(clients.communicate())
+
+    rng = random.Random(0)
+    changes = 0
+    start = time.monotonic()
+    while not communicate.done():
+        # Catches up with the requested rate, so the changes only fall behind when the IOLoop does
+        while changes < args.changes * (time.monotonic() - start):
+            random_change(lines, rng, station_lines, station_ids)
+            changes += 1
+        await asyncio.sleep(0.1)
+    seconds = time.monotonic() - start
+    received = json.loads((await communicate)[0].decode("utf-8").strip().splitlines()[-1])
+
+    live.stop()
+    server.stop()
+
+    # What the clients would have downloaded reloading the page instead, compressed
+    page_bytes = len(page.render()[2])
+    return {
+        "clients": args.clients,
+        "compression": args.compression,
+        "changes_per_second": changes / seconds,
+        "updates_per_client": received["messages"] / args.clients,
+        "flush_ms_mean": 1000 * sum(flush_seconds) / len(flush_seconds),
+        "flush_ms_max": 1000 * max(flush_seconds),
+        "live_bytes_per_client_per_second": received["bytes"] / args.clients / args.duration,
+        "refresh_bytes_per_client_per_second": page_bytes / _REFRESH_SECS,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000, help="WebSocket clients receiving the updates")
+    parser.add_argument("--changes", type=float, default=200.0, help="Changes of the models per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds the clients receive updates for")
+    parser.add_argument("--flush-secs", type=float, default=1.0, help="Seconds between flushes of the updates")
+    parser.add_argument("--compression", action="store_true", help="Compress the updates with permessage-deflate")
+    parser.add_argument("--run-clients", metavar="URL", help="Run the clients of URL in this process")
+    args = parser.parse_args()
+
+    _raise_open_files_limit()
+    if args.run_clients is not None:
+        print(json.dumps(asyncio.run(_run_clients(args.run_clients, args.clients, args.duration))))
+    else:
+        print(json.dumps(asyncio.run(_run_server(args))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Measures the latency of the status page while the consumers work through a backlog of messages.
+
+Each consume loop of KafkaConsumer (see benchmarks/consume.py) runs in its own process, against the
+mock cluster built into librdkafka. Four consumers read turnstile summaries from their own topics
+into the Lines model, like the server does, while a client thread requests the page every 50 ms.
+Requests start with the first handled message and last --duration seconds. Run from the consumers
+directory:
+
+    python -m benchmarks.page_latency --backlog 100000 --duration 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+from os import environ
+
+from confluent_kafka import Producer
+
+from benchmarks._fixtures import TRANSFORMED_STATIONS_TOPIC, Message
+
+
+_NUM_TOPICS = 4
+_NUM_STATIONS = 33
+
+_MODES = {
+    "poll": {"poll_thread": False, "batch_size": 1},
+    "batch": {"poll_thread": False},
+    "thread": {"poll_thread": True},
+}
+
+
+def _mock_cluster() -> tuple[Producer, str]:
+    producer = Producer({"test.mock.num.brokers": 1})
+    brokers = producer.list_topics(timeout=10).brokers.values()
+    return producer, ",".join(f"{broker.host}:{broker.port}" for broker in brokers)
+
+
+def _station_ids() -> list[int]:
+    return [40000 + index for index in range(3 * _NUM_STATIONS)]
+
+
+def _load_lines(lines):
+    """Adds the stations of three lines, as the transformed stations would"""
+    for index, station_id in enumerate(_station_ids()):
+        value = {
+            "station_id": station_id,
+            "station_name": f"Station {station_id}",
+            "order": index % _NUM_STATIONS,
+            "line": ("blue", "green", "red")[index // _NUM_STATIONS]
+        }
+        lines.process_message(Message(TRANSFORMED_STATIONS_TOPIC, json.dumps(value)))
+
+
+def _produce_backlog(producer: Producer, topics: list[str], num_messages: int):
+    station_ids = _station_ids()
+    rng = random.Random(0)
+    for topic in topics:
+        for _ in range(num_messages):
+            value = json.dumps({"STATION_ID": rng.choice(station_ids), "COUNT": rng.randrange(1000)})
+            while True:
+                try:
+                    producer.produce(topic, value=value)
+                    break
+                except BufferError:
+                    producer.poll(0.1)
+        producer.flush()
+
+
+def _request_page(url: str, started: threading.Event, duration: float, latencies: list[float]):
+    started.wait()
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        with urllib.request.urlopen(url, timeout=60) as response:
+            response.read()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.05)
+
+
+async def _run_mode(mode: str, backlog: int, duration: float) -> dict:
+    import tornado.httpserver
+    import tornado.netutil
+    import tornado.web
+
+    from consumer import KafkaConsumer
+    from models import Lines, Weather
+    from server import MainHandler, StatusPage
+
+    producer, bootstrap_servers = _mock_cluster()
+    # Read by KafkaConsumer
+    environ["BROKER_URL"] = bootstrap_servers
+    topics = [f"benchmark.page.{index}" for index in range(_NUM_TOPICS)]
+    _produce_backlog(producer, topics, backlog)
+
+    weather = Weather()
+    lines = Lines()
+    _load_lines(lines)
+
+    application = tornado.web.Application([(r"/", MainHandler, {"page": StatusPage(weather, lines)})])
+    sockets = tornado.netutil.bind_sockets(0, "127.0.0.1")
+    server = tornado.httpserver.HTTPServer(application)
+    server.add_sockets(sockets)
+    url = f"http://127.0.0.1:{sockets[0].getsockname()[1]}/"
+
+    started = threading.Event()
+    handled_times = []
+
+    def handle(message):
+        lines.process_message(Message("TURNSTILE_SUMMARY", message.value()))
+        handled_times.append(time.perf_counter())
+        started.set()
+
+    consumers = [
+        KafkaConsumer(topic, handle, is_avro=False, offset_earliest=True, **_MODES[mode]) for topic in topics
+    ]
+    tasks = [asyncio.create_task(consumer.consume()) for consumer in consumers]
+
+    latencies = []
+    client = threading.Thread(target=_request_page, args=(url, started, duration, latencies), daemon=True)
+    client.start()
+    while client.is_alive():
+        await asyncio.sleep(0.1)
+
+    for task in tasks:
+        task.cancel()
+    for consumer in consumers:
+        consumer.close()
+    server.stop()
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "backlog": backlog * _NUM_TOPICS,
+        "handled": len(handled_times),
+        "drain_seconds": handled_times[-1] - handled_times[0],
+        "requests": len(latencies),
+        "latency_mean_ms": 1000 * sum(latencies) / len(latencies),
+        "latency_p50_ms": 1000 * latencies[len(latencies) // 2],
+        "latency_p95_ms": 1000 * latencies[int(len(latencies) * 0.95)],
+        "latency_max_ms": 1000 * latencies[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default="poll,batch,thread", help="Comma separated consume loops")
+    parser.add_argument("--backlog", type=int, default=100000, help="Messages waiting in each topic")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds the page is requested for")
+    parser.add_argument("--mode", help="Run a single mode in this process")
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        print(json.dumps(asyncio.run(_run_mode(args.mode, args.backlog, args.duration))))
+        return
+
+    for mode in args.modes.split(","):
+        result = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.page_latency", "--mode", mode,
+                "--backlog", str(args.backlog), "--duration", str(args.duration)
+            ],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+        print(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Measures the messages per second handled by the Lines model, with the routing table and with the
+routing it replaced ("legacy").
+
+The legacy routing checked the topic with substring and regular expression matches on every message,
+decoded the transformed stations twice, and sent every turnstile summary to every line. Both run on
+the same message set: the stations of producers/data/cta_stations.csv as Faust transforms them,
+followed by arrivals and turnstile summaries at random stations, like the other benchmarks apply,
+replayed --repeat times. The state of the stations is compared at the end. Run from the consumers
+directory:
+
+    python -m benchmarks.routing --messages 100000
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from benchmarks._fixtures import TRANSFORMED_STATIONS_TOPIC, Message, random_message, transformed_stations
+from models import ARRIVAL_TOPIC_PATTERN, Line, Lines, Station
+
+
+def _messages(num_messages: int, seed: int) -> tuple[list[Message], list[Message]]:
+    """Returns the station messages and the arrival and turnstile summary messages"""
+    stations = transformed_stations()
+    station_messages = [Message(TRANSFORMED_STATIONS_TOPIC, json.dumps(station)) for station in stations]
+    station_lines = {station["station_id"]: station["line"] for station in stations}
+
+    rng = random.Random(seed)
+    station_ids = sorted(station_lines)
+    messages = [random_message(rng, station_lines, station_ids) for _ in range(num_messages)]
+    return station_messages, messages
+
+
+def _legacy_line_process_message(line, message):
+    if re.match(r"^com\.udacity\.nd029\.p1\.v1\.transformedstations$", message.topic()) is not None:
+        value = json.loads(message.value())
+        if value["line"] == line.color:
+            line.stations[value["station_id"]] = Station.from_message(value)
+    elif ARRIVAL_TOPIC_PATTERN.match(message.topic()) is not None:
+        line.handle_arrival(message.value())
+    elif message.topic() == "TURNSTILE_SUMMARY":
+        json_data = json.loads(message.value())
+        station = line.stations.get(json_data.get("STATION_ID"))
+        if station is not None:
+            station.process_message(json_data)
+
+
+def _legacy_process_message(lines, message):
+    if "com.udacity.nd029.p1.v1" in message.topic():
+        value = message.value()
+        if message.topic() == TRANSFORMED_STATIONS_TOPIC:
+            value = json.loads(value)
+        color = value["line"]
+        if color is None or color == "unknown":
+            return
+        line = lines.lines.get(color)
+        if line is None:
+            line = lines.lines[color] = Line(color)
+        _legacy_line_process_message(line, message)
+    elif "TURNSTILE_SUMMARY" == message.topic():
+        for line in lines.lines.values():
+            _legacy_line_process_message(line, message)
+
+
+def _state(lines) -> dict:
+    return {
+        (color, station_id): (station.dir_a, station.dir_b, station.num_turnstile_entries)
+        for color, line in lines.lines.items()
+        for station_id, station in line.stations.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100000, help="Arrivals and turnstile summaries per replay")
+    parser.add_argument("--repeat", type=int, default=5, help="Times the message set is replayed")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the message set")
+    args = parser.parse_args()
+
+    station_messages, messages = _messages(args.messages, args.seed)
+
+    states = {}
+    for routing, process_message in (
+        ("legacy", _legacy_process_message),
+        ("routing_table", lambda lines, message: lines.process_message(message)),
+    ):
+        lines = Lines()
+        for message in station_messages:
+            process_message(lines, message)
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for message in messages:
+                process_message(lines, message)
+        seconds = time.perf_counter() - start
+
+        states[routing] = _state(lines)
+        print(json.dumps({
+            "routing": routing,
+            "messages": len(messages) * args.repeat,
+            "messages_per_second": len(messages) * args.repeat / seconds
+        }))
+
+    print(json.dumps({"same_state": states["legacy"] == states["routing_table"]}))
+
+
+if __name__ == "__main__":
+    main()
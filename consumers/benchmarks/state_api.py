@@ -0,0 +1,77 @@
+"""Measures the bytes a client polling the JSON state API transfers, with the changes since its last
+version (/api/changes) and with the snapshot (/api/state), both plain and gzip compressed.
+
+The models hold the stations of producers/data/cta_stations.csv. Between two polls, --changes
+arrivals and turnstile summaries are applied at random stations; no time passes, so the run is
+deterministic. The client applies the changes to the first snapshot, and whether it ends with the
+same stations and trains as the last snapshot is reported. Run from the consumers directory:
+
+    python -m benchmarks.state_api --changes 10,100,1000 --polls 100
+"""
+import argparse
+import gzip
+import json
+import random
+
+from benchmarks._fixtures import load_lines, random_change
+
+
+def _apply(state: dict, changes: dict):
+    """Applies the changes to the stations and trains of a client, keyed by line and station id"""
+    for station in changes["stations"]:
+        key = (station["line"], station["station_id"])
+        state["stations"][key] = station
+        state["trains"][key] = []
+    for train in changes["trains"]:
+        state["trains"][(train["line"], train["station_id"])].append(train)
+
+
+def _client_state(snapshot: dict) -> dict:
+    state = {"stations": {}, "trains": {}}
+    _apply(state, snapshot)
+    return state
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--changes", default="10,100,1000", help="Comma separated changes between two polls")
+    parser.add_argument("--polls", type=int, default=100, help="Polls of the client")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the changes")
+    args = parser.parse_args()
+
+    from models import Lines, Weather
+    from server import StateApi
+
+    for num_changes in (int(changes) for changes in args.changes.split(",")):
+        weather = Weather()
+        lines = Lines()
+        api = StateApi(weather, lines)
+        station_lines = load_lines(lines)
+        station_ids = sorted(station_lines)
+        rng = random.Random(args.seed)
+
+        totals = {"changes_bytes": 0, "changes_gzip_bytes": 0, "snapshot_bytes": 0, "snapshot_gzip_bytes": 0}
+        version = api.change_log.version
+        client_state = _client_state(json.loads(api.snapshot()[1]))
+        for _ in range(args.polls):
+            for _ in range(num_changes):
+                random_change(lines, rng, station_lines, station_ids)
+            changes = api.changes(version, api.instance)
+            _, snapshot, gzip_snapshot = api.snapshot()
+            totals["changes_bytes"] += len(changes)
+            totals["changes_gzip_bytes"] += len(gzip.compress(changes, compresslevel=6))
+            totals["snapshot_bytes"] += len(snapshot)
+            totals["snapshot_gzip_bytes"] += len(gzip_snapshot)
+            changes = json.loads(changes)
+            _apply(client_state, changes)
+            version = changes["version"]
+
+        print(json.dumps({
+            "changes_per_poll": num_changes,
+            **{f"{name}_per_poll": total / args.polls for name, total in totals.items()},
+            "same_state": client_state == _client_state(json.loads(api.snapshot()[1])),
+        }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Measures the requests per second of the status page, rendered on every request as it used to be
+("render") and cached per version of the models by StatusPage: fetched like a plain client
+("cached"), with gzip ("gzip"), and revalidated with the ETag of the previous response, like a
+browser refreshing the page ("revalidate").
+
+The page shows the stations of producers/data/cta_stations.csv. While --clients threads request
+it, turnstile summaries change the Lines model --changes times per second. Each mode runs in its
+own process. Run from the consumers directory:
+
+    python -m benchmarks.status_page --requests 2000 --clients 4 --changes 10
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from pathlib import Path
+
+from benchmarks._fixtures import Message, load_lines
+
+
+_MODES = ("render", "cached", "gzip", "revalidate")
+
+
+def _request_page(url: str, mode: str, num_requests: int, statuses: list[int]):
+    headers = {"Accept-Encoding": "gzip"} if mode in ("gzip", "revalidate") else {}
+    etag = None
+    for _ in range(num_requests):
+        if mode == "revalidate" and etag is not None:
+            headers["If-None-Match"] = etag
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=60) as response:
+                response.read()
+                etag = response.headers.get("Etag")
+                statuses.append(response.status)
+        except urllib.error.HTTPError as e:
+            # urllib raises on 304 Not Modified
+            statuses.append(e.code)
+
+
+async def _run_mode(mode: str, num_requests: int, num_clients: int, changes: float) -> dict:
+    import tornado.httpserver
+    import tornado.netutil
+    import tornado.template
+    import tornado.web
+
+    from models import Lines, Weather
+    from server import MainHandler, StatusPage
+
+    weather = Weather()
+    lines = Lines()
+    station_ids = sorted(load_lines(lines))
+
+    if mode == "render":
+        # The template and handler before StatusPage, sorting the stations on every request
+        template = tornado.template.Template(
+            (Path(__file__).parents[1] / "templates" / "status.html").read_text().replace(
+                "line.ordered_stations", "sorted(line.stations.values(), key=lambda x: x.order)"
+            )
+        )
+
+        class RenderHandler(tornado.web.RequestHandler):
+            def get(self):
+                self.write(template.generate(weather=weather, lines=lines))
+
+        handlers = [(r"/", RenderHandler)]
+    else:
+        handlers = [(r"/", MainHandler, {"page": StatusPage(weather, lines)})]
+
+    sockets = tornado.netutil.bind_sockets(0, "127.0.0.1")
+    server = tornado.httpserver.HTTPServer(tornado.web.Application(handlers))
+    server.add_sockets(sockets)
+    url = f"http://127.0.0.1:{sockets[0].getsockname()[1]}/"
+
+    statuses = []
+    clients = [
+        threading.Thread(target=_request_page, args=(url, mode, num_requests, statuses), daemon=True)
+        for _ in range(num_clients)
+    ]
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    while any(client.is_alive() for client in clients):
+        if changes > 0:
+            value = json.dumps({"STATION_ID": rng.choice(station_ids), "COUNT": rng.randrange(1000)})
+            lines.process_message(Message("TURNSTILE_SUMMARY", value))
+        await asyncio.sleep(1.0 / changes if changes > 0 else 0.05)
+    seconds = time.perf_counter() - start
+    server.stop()
+
+    return {
+        "mode": mode,
+        "requests": len(statuses),
+        "not_modified": statuses.count(304),
+        "requests_per_second": len(statuses) / seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", default=",".join(_MODES), help="Comma separated modes")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests of each client")
+    parser.add_argument("--clients", type=int, default=4, help="Client threads requesting the page")
+    parser.add_argument("--changes", type=float, default=10.0, help="Changes of the models per second")
+    parser.add_argument("--mode", help="Run a single mode in this process")
+    args = parser.parse_args()
+
+    if args.mode is not None:
+        print(json.dumps(asyncio.run(_run_mode(args.mode, args.requests, args.clients, args.changes))))
+        return
+
+    for mode in args.modes.split(","):
+        result = subprocess.run(
+            [
+                sys.executable, "-m", "benchmarks.status_page", "--mode", mode, "--requests", str(args.requests),
+                "--clients", str(args.clients), "--changes", str(args.changes)
+            ],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+        print(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
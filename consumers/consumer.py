@@ -1,15 +1,18 @@
 """Defines core consumer functionality"""
+import asyncio
 import re
 import logging
+import threading
 
 from os import environ
 
 import confluent_kafka
 from confluent_kafka import Consumer, OFFSET_BEGINNING
-from confluent_kafka.avro import AvroConsumer
 from confluent_kafka.avro.serializer import SerializerError
 from tornado import gen
 
+import avro_codec
+
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +24,19 @@ class KafkaConsumer:
     def error_cb(error):
         logger.error("error: %s", error)
 
+    # Maximum number of messages fetched by each consume call. 1 polls a message at a time
+    BATCH_SIZE = int(environ.get("CONSUMER_BATCH_SIZE") or "500")
+    # Sleep after a batch that was not full. It doubles while the topics are idle, up to sleep_secs
+    MIN_SLEEP_SECS = float(environ.get("CONSUMER_MIN_SLEEP_SECS") or "0.01")
+    # Whether Kafka is polled from a dedicated thread instead of the IOLoop, and how many batches
+    # it can queue for the IOLoop before it stops fetching
+    POLL_THREAD = (environ.get("CONSUMER_POLL_THREAD") or "true").lower() in ("1", "true", "yes")
+    QUEUE_SIZE = int(environ.get("CONSUMER_QUEUE_SIZE") or "4")
+    # Seconds the polling thread waits to fill a batch once it has its first message
+    BATCH_LINGER_SECS = 0.005
+    # Seconds close waits for the polling thread to stop
+    CLOSE_TIMEOUT_SECS = 5.0
+
     def __init__(
         self,
         topic_name_pattern,
@@ -29,13 +45,26 @@ class KafkaConsumer:
         offset_earliest=False,
         sleep_secs=1.0,
         consume_timeout=0.1,
+        batch_size=None,
+        min_sleep_secs=None,
+        batch_handler=None,
+        poll_thread=None,
+        queue_size=None,
     ):
-        """Creates a consumer object for asynchronous use"""
+        """Creates a consumer object for asynchronous use. When batch_handler is given, it is
+        called with the list of messages of every batch instead of calling message_handler for each
+        of them"""
         self.topic_name_pattern = topic_name_pattern
         self.message_handler = message_handler
+        self.batch_handler = batch_handler
         self.sleep_secs = sleep_secs
         self.consume_timeout = consume_timeout
+        self.batch_size = batch_size or KafkaConsumer.BATCH_SIZE
+        self.min_sleep_secs = min(KafkaConsumer.MIN_SLEEP_SECS if min_sleep_secs is None else min_sleep_secs, sleep_secs)
+        self.poll_thread = KafkaConsumer.POLL_THREAD if poll_thread is None else poll_thread
+        self.queue_size = queue_size or KafkaConsumer.QUEUE_SIZE
         self.offset_earliest = offset_earliest
+        self.is_avro = is_avro
         self.group_id = f'{topic_name_pattern}-group'
 
         self.broker_properties = {
@@ -46,18 +75,18 @@ class KafkaConsumer:
             "error_cb": KafkaConsumer.error_cb
         }
 
-        if is_avro:
-            self.broker_properties["schema.registry.url"] = environ.get("SCHEMA_REGISTRY_URL") or "http://localhost:8081"
-            self.consumer = AvroConsumer(
-                self.broker_properties
-            )
-        else:
-            self.consumer = Consumer(
-                self.broker_properties
-            )
+        # Avro messages are decoded by avro_codec, which caches the writer schemas by registry id
+        self.consumer = Consumer(
+            self.broker_properties
+        )
 
         self.consumer.subscribe([self.topic_name_pattern], on_assign=self.on_assign)
 
+        self._queue = None
+        self._slots = None
+        self._thread = None
+        self._stopping = threading.Event()
+
     def on_assign(self, consumer, partitions):
         """Callback for when topic assignment takes place"""
         if self.offset_earliest:
@@ -68,12 +97,132 @@ class KafkaConsumer:
 
     async def consume(self):
         """Asynchronously consumes data from kafka topic"""
+        if self.poll_thread:
+            await self._consume_from_thread()
+            return
+
+        if self.batch_size > 1:
+            await self._consume_batches()
+            return
+
         while True:
             num_results = 1
             while num_results > 0:
                 num_results = self._consume()
             await gen.sleep(self.sleep_secs)
 
+    async def _consume_from_thread(self):
+        """Polls Kafka from a dedicated thread, which decodes the messages and passes them to the
+        IOLoop through a queue bounded to queue_size batches. The handlers run on the IOLoop, so the
+        models they update are only ever touched by it"""
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._slots = threading.Semaphore(self.queue_size)
+        self._thread = threading.Thread(
+            target=self._poll_loop, args=(loop,), name=f"{self.group_id}-poll", daemon=True
+        )
+        self._thread.start()
+
+        while True:
+            batch = await self._queue.get()
+            self._slots.release()
+            self._dispatch(batch)
+            # get does not yield while batches are queued, so requests would wait for all of them
+            await asyncio.sleep(0)
+
+    def _poll_loop(self, loop):
+        """Runs in the polling thread. Blocks on Kafka until a message arrives, then takes what else
+        is already fetched, up to batch_size. While queue_size batches wait for the IOLoop, it stops
+        fetching until the handlers catch up"""
+        while not self._stopping.is_set():
+            if not self._slots.acquire(timeout=self.consume_timeout):
+                continue
+
+            batch = self._fetch_batch(self.consume_timeout)
+            if not batch:
+                self._slots.release()
+                continue
+
+            # Scheduling put_nowait does not wait for the IOLoop, the slot taken above bounds the queue
+            loop.call_soon_threadsafe(self._queue.put_nowait, batch)
+
+    async def _consume_batches(self):
+        """Consumes batches of messages. The sleep between them adapts to the traffic: none after a
+        full batch, min_sleep_secs after a partial one, and doubling up to sleep_secs while the
+        topics are idle"""
+        sleep_secs = self.min_sleep_secs
+        while True:
+            num_results = self._consume_batch()
+            if num_results >= self.batch_size:
+                sleep_secs = 0.0
+            elif num_results > 0:
+                sleep_secs = self.min_sleep_secs
+            else:
+                sleep_secs = min(max(sleep_secs * 2, self.min_sleep_secs), self.sleep_secs)
+            # Sleeping even for 0 seconds yields to the other consumers and the web server
+            await gen.sleep(sleep_secs)
+
+    def _consume_batch(self):
+        """Fetches the messages already received, up to batch_size, without blocking, and handles
+        them. Returns the number of messages handled"""
+        batch = self._fetch_batch(0)
+        self._dispatch(batch)
+        return len(batch)
+
+    def _fetch_batch(self, timeout):
+        """Returns up to batch_size decoded messages. With a timeout, it waits up to that long for
+        the first message, then up to BATCH_LINGER_SECS for the rest of the batch"""
+        try:
+            if timeout > 0:
+                message = self.consumer.poll(timeout)
+                if message is None:
+                    return []
+                messages = [message, *self.consumer.consume(self.batch_size - 1, KafkaConsumer.BATCH_LINGER_SECS)]
+            else:
+                messages = self.consumer.consume(self.batch_size, 0)
+        except KeyboardInterrupt:
+            raise
+        except:
+            logger.exception("%s: Exception raised while consuming messages", self.group_id)
+            return []
+
+        batch = []
+        for message in messages:
+            if message.error() is not None:
+                logger.info("%s: Error recieved consuming message: %s", self.group_id, message.error())
+                continue
+            try:
+                if self.is_avro:
+                    avro_codec.decode_message(message)
+            except SerializerError:
+                logger.exception("%s: Unable to decode message", self.group_id)
+                continue
+            batch.append(message)
+        return batch
+
+    def _dispatch(self, batch):
+        """Passes a batch of messages to the handlers"""
+        if not batch:
+            return
+        logger.debug("%s: Consumed %d messages", self.group_id, len(batch))
+
+        if self.batch_handler is not None:
+            try:
+                self.batch_handler(batch)
+            except KeyboardInterrupt:
+                raise
+            except:
+                logger.exception("%s: Exception raised while handling messages", self.group_id)
+            return
+
+        for message in batch:
+            try:
+                self.message_handler(message)
+            except KeyboardInterrupt:
+                raise
+            except:
+                logger.exception("%s: Exception raised while handling message", self.group_id)
+
     def _consume(self):
         """Polls for a message. Returns 1 if a message was received, 0 otherwise"""
         try:
@@ -84,6 +233,8 @@ class KafkaConsumer:
             elif message.error() is not None:
                 logger.info("%s: Error recieved polling message: %s", self.group_id, message.error())
             else:
+                if self.is_avro:
+                    avro_codec.decode_message(message)
                 logger.debug("%s: Consumed message. key: %s, message: %s",
                     self.group_id, message.key(), message.value())
                 self.message_handler(message)
@@ -98,4 +249,10 @@ class KafkaConsumer:
 
     def close(self):
         """Cleans up any open kafka consumers"""
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(KafkaConsumer.CLOSE_TIMEOUT_SECS)
+            if self._thread.is_alive():
+                logger.warning("%s: Polling thread did not stop in time", self.group_id)
+                return
         self.consumer.close()
@@ -3,7 +3,7 @@ from dataclasses import dataclass
 import logging
 
 from os import environ
-from typing import Final
+from typing import Final, Optional
 
 import faust
 
@@ -23,6 +23,8 @@ class Station(faust.Record):
     red: bool
     blue: bool
     green: bool
+    # Only set by bootstrap_stations.py for the lines of generated networks
+    line: Optional[str] = None
 
 
 # Faust will produce records to Kafka in this format
@@ -72,7 +74,7 @@ async def transform_stations(stations):
             station_id=station.station_id,
             station_name=station.station_name,
             order=station.order,
-            line=_STATION_FLAG_TO_COLOR_MAP.get((station.red, station.blue, station.green), "unknown")
+            line=station.line or _STATION_FLAG_TO_COLOR_MAP.get((station.red, station.blue, station.green), "unknown")
         )
 
 if __name__ == "__main__":
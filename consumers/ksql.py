@@ -1,6 +1,7 @@
 """Configures KSQL to combine station and turnstile data"""
 import json
 import logging
+import time
 
 from os import environ
 
@@ -14,13 +15,19 @@ logger = logging.getLogger(__name__)
 
 KSQL_URL = broker=environ.get("KSQL_URL") or "http://localhost:8088"
 
+# Seconds given to Kafka to delete the topic of a dropped turnstile_summary table
+TOPIC_DELETION_TIMEOUT_SECS = 60.0
+
 # Shouldn't 'turnstile' be a stream?
+# Aggregated turnstile records carry the number of entries for the tick. Records produced one per
+# rider have no 'entries' field, so each of them counts as a single entry.
 KSQL_STATEMENT = """
 CREATE STREAM turnstile (
     timestamp BIGINT,
     station_id BIGINT,
     station_name VARCHAR,
-    line VARCHAR
+    line VARCHAR,
+    entries INT
 ) WITH (
     KAFKA_TOPIC='com.udacity.nd029.p1.v1.turnstile',
     VALUE_FORMAT='AVRO',
@@ -28,23 +35,18 @@ CREATE STREAM turnstile (
 );
 
 CREATE TABLE turnstile_summary WITH (VALUE_FORMAT='JSON') AS
-  SELECT station_id, COUNT() as count FROM turnstile GROUP BY station_id;
+  SELECT station_id, SUM(IFNULL(entries, 1)) as count FROM turnstile GROUP BY station_id;
 """
 
 
-def execute_statement():
-    """Executes the KSQL statement against the KSQL API"""
-    if topic_check.topic_exists("TURNSTILE_SUMMARY") is True:
-        return
-
-    logging.debug("executing ksql statement...")
-
+def _post_statement(statement):
+    """Posts a statement to the KSQL API and returns the decoded response"""
     resp = requests.post(
         f"{KSQL_URL}/ksql",
         headers={"Content-Type": "application/vnd.ksql.v1+json"},
         data=json.dumps(
             {
-                "ksql": KSQL_STATEMENT,
+                "ksql": statement,
                 "streamsProperties": {"ksql.streams.auto.offset.reset": "earliest"},
             }
         ),
@@ -52,6 +54,55 @@ def execute_statement():
 
     # Ensure that a 2XX status code was returned
     resp.raise_for_status()
+    return resp.json()
+
+
+def _drop_counting_summary():
+    """Drops turnstile_summary and the turnstile stream when the table was created by the previous
+    statement, which counted the records instead of summing their entries. Returns whether they were
+    dropped"""
+    try:
+        description = _post_statement("DESCRIBE EXTENDED turnstile_summary;")[0]["sourceDescription"]
+    except (requests.HTTPError, KeyError, IndexError):
+        logger.warning("unable to describe the turnstile_summary table, leaving it as it is")
+        return False
+
+    write_queries = description.get("writeQueries", [])
+    if any("SUM(" in query["queryString"].upper() for query in write_queries):
+        return False
+
+    # Recreated from the earliest offset, so every recorded turnstile event is summed again
+    logger.info("dropping the turnstile_summary table counting turnstile records")
+    for query in write_queries:
+        _post_statement(f"TERMINATE {query['id']};")
+    _post_statement("DROP TABLE turnstile_summary DELETE TOPIC;")
+    _post_statement("DROP STREAM turnstile;")
+    return True
+
+
+def _wait_for_topic_deletion(topic):
+    """Waits until the topic is gone from the cluster metadata. Kafka deletes topics asynchronously,
+    and the table cannot be recreated on a topic still marked for deletion"""
+    deadline = time.monotonic() + TOPIC_DELETION_TIMEOUT_SECS
+    while topic_check.topic_exists(topic, refresh=True):
+        if time.monotonic() > deadline:
+            raise RuntimeError(
+                f"Topic {topic} was not deleted within {TOPIC_DELETION_TIMEOUT_SECS:.0f} seconds, "
+                "run ksql.py again once it is gone"
+            )
+        time.sleep(0.5)
+
+
+def execute_statement():
+    """Executes the KSQL statement against the KSQL API"""
+    if topic_check.topic_exists("TURNSTILE_SUMMARY") is True:
+        if not _drop_counting_summary():
+            return
+        _wait_for_topic_deletion("TURNSTILE_SUMMARY")
+
+    logging.debug("executing ksql statement...")
+
+    _post_statement(KSQL_STATEMENT)
 
 
 if __name__ == "__main__":
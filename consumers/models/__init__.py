@@ -1,4 +1,5 @@
 from .station import Station
-from .line import Line
+from .line import ARRIVAL_TOPIC_PATTERN, Line
 from .lines import Lines
 from .weather import Weather
+from .change_log import ChangeLog
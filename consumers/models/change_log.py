@@ -0,0 +1,46 @@
+"""Contains functionality related to the Change Log"""
+import logging
+
+from collections import OrderedDict
+from os import environ
+
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeLog:
+    """Numbers the changes of the models, and remembers the version at which each entity last
+    changed, so the entities changed since a version can be listed"""
+
+    # Entities remembered. Older changes are forgotten, diffs from before them are not possible
+    MAX_ENTITIES = int(environ.get("CHANGE_LOG_MAX_ENTITIES") or "10000")
+
+    def __init__(self, max_entities=None):
+        """Creates an empty change log"""
+        self.max_entities = max_entities or ChangeLog.MAX_ENTITIES
+        self.version = 0
+        # Entity key -> version of its last change, from the least to the most recently changed
+        self._entities = OrderedDict()
+        # Version of the most recent change forgotten
+        self.forgotten_version = 0
+
+    def record(self, key):
+        """Records a change of the entity with the given key"""
+        self.version += 1
+        self._entities[key] = self.version
+        self._entities.move_to_end(key)
+        if len(self._entities) > self.max_entities:
+            _, self.forgotten_version = self._entities.popitem(last=False)
+
+    def changed_since(self, version):
+        """Returns the keys of the entities changed after the given version, or None when the log
+        does not go back that far"""
+        if version < self.forgotten_version or version > self.version:
+            return None
+
+        keys = []
+        for key in reversed(self._entities):
+            if self._entities[key] <= version:
+                break
+            keys.append(key)
+        return keys
@@ -1,13 +1,16 @@
 """Contains functionality related to Lines"""
-import json
 import logging
 import re
+import zlib
 
 from models import Station
 
 
 logger = logging.getLogger(__name__)
 
+# Matches both the per station arrival topics and the single arrivals topic
+ARRIVAL_TOPIC_PATTERN = re.compile(r"^com\.udacity\.nd029\.p1\.v1\.arrival(s|\..*)$")
+
 
 class Line:
     """Defines the Line Model"""
@@ -22,24 +25,30 @@ class Line:
             self.color_code = "#DC143C"
         elif self.color == "green":
             self.color_code = "#32CD32"
+        else:
+            # Lines of generated networks get a color derived from their name
+            self.color_code = "#{:06X}".format(zlib.crc32(self.color.encode("utf-8")) & 0xFFFFFF)
         self.stations = {}
-
-    def _handle_station(self, value):
-        """Adds the station to this Line's data model"""
-        if value["line"] != self.color:
-            return
-        self.stations[value["station_id"]] = Station.from_message(value)
-
-    def _handle_arrival(self, message):
-        """Updates train locations"""
-        value = message.value()
-
+        # The stations sorted by their order, as they are shown on the status page
+        self.ordered_stations = []
+
+    def add_station(self, value):
+        """Adds the station of a transformed station message to this Line's data model. Returns it"""
+        station = Station.from_message(value)
+        self.stations[value["station_id"]] = station
+        self.ordered_stations = sorted(self.stations.values(), key=lambda station: station.order)
+        return station
+
+    def handle_arrival(self, value):
+        """Updates train locations. Returns the stations whose trains changed"""
+        changed = []
         prev_station_id = value.get("prev_station_id")
         prev_dir = value.get("prev_direction")
         if prev_dir is not None and prev_station_id is not None:
             prev_station = self.stations.get(prev_station_id)
             if prev_station is not None:
                 prev_station.handle_departure(prev_dir)
+                changed.append(prev_station)
             else:
                 logger.debug("Unable to handle previous station due to missing station")
         else:
@@ -51,44 +60,10 @@ class Line:
         station = self.stations.get(station_id)
         if station is None:
             logger.debug("unable to handle message due to missing station")
-            return
+            return changed
 
         station.handle_arrival(
             value.get("direction"), value.get("train_id"), value.get("train_status")
         )
-
-
-    @staticmethod
-    def _is_transformedstations_message(message):
-        return re.match("^com\.udacity\.nd029\.p1\.v1\.transformedstations$", message.topic()) is not None
-
-    @staticmethod
-    def _is_arrival_message(message):
-        return re.match("^com\.udacity\.nd029\.p1\.v1\.arrival\..*$", message.topic()) is not None
-
-    @staticmethod
-    def _is_turnstile_summary_message(message):
-        return message.topic() == "TURNSTILE_SUMMARY"
-
-    def process_message(self, message):
-        """Given a kafka message, extract data"""
-        if Line._is_transformedstations_message(message):
-            try:
-                value = json.loads(message.value())
-                self._handle_station(value)
-            except Exception as e:
-                logger.fatal("bad station? %s, %s", value, e)
-        elif Line._is_arrival_message(message):
-            self._handle_arrival(message)
-        elif Line._is_turnstile_summary_message(message):
-            json_data = json.loads(message.value())
-            station_id = json_data.get("STATION_ID")
-            station = self.stations.get(station_id)
-            if station is None:
-                logger.debug("unable to handle message due to missing station")
-                return
-            station.process_message(json_data)
-        else:
-            logger.debug(
-                "unable to find handler for message from topic %s", message.topic()
-            )
+        changed.append(station)
+        return changed
@@ -2,38 +2,99 @@
 import json
 import logging
 
-from models import Line
+from models import ARRIVAL_TOPIC_PATTERN, Line
 
 
 logger = logging.getLogger(__name__)
 
 
+TRANSFORMED_STATIONS_TOPIC = "com.udacity.nd029.p1.v1.transformedstations"
+TURNSTILE_SUMMARY_TOPIC = "TURNSTILE_SUMMARY"
+
+
 class Lines:
     """Contains all train lines"""
 
     def __init__(self):
-        """Creates the Lines object"""
-        self.red_line = Line("red")
-        self.green_line = Line("green")
-        self.blue_line = Line("blue")
+        """Creates the Lines object. The CTA lines are listed first, any other line is added as its
+        stations and arrivals are received"""
+        self.lines = {color: Line(color) for color in ("blue", "green", "red")}
+        # station_id -> {color: station} of every station received. Transfer stations are on more
+        # than one line, each line keeps its own Station
+        self.stations = {}
+        # Topic name -> handler of its messages, added the first time a topic is seen
+        self._routes = {}
+        # Increases on every change, so the status page is only rendered again when needed
+        self.version = 0
+        # Called with the line color and station id of every station that changed
+        self.listeners = []
+
+    def _route(self, topic):
+        """Returns the handler of the messages of a topic"""
+        if topic == TRANSFORMED_STATIONS_TOPIC:
+            return self._handle_station
+        elif ARRIVAL_TOPIC_PATTERN.match(topic) is not None:
+            return self._handle_arrival
+        elif topic == TURNSTILE_SUMMARY_TOPIC:
+            return self._handle_turnstile_summary
+
+        logger.info("ignoring non-lines messages of topic %s", topic)
+        return lambda value: None
+
+    def _changed(self, color, stations):
+        self.version += 1
+        for listener in self.listeners:
+            for station in stations:
+                listener(color, station.station_id)
+
+    def _line(self, color):
+        line = self.lines.get(color)
+        if line is None:
+            line = self.lines[color] = Line(color)
+        return line
 
     def process_message(self, message):
-        """Processes a station message"""
-        if "com.udacity.nd029.p1.v1" in message.topic():
-            value = message.value()
-            if message.topic() == "com.udacity.nd029.p1.v1.transformedstations":
-                value = json.loads(value)
-            if value["line"] == "green":
-                self.green_line.process_message(message)
-            elif value["line"] == "red":
-                self.red_line.process_message(message)
-            elif value["line"] == "blue":
-                self.blue_line.process_message(message)
-            else:
-                logger.debug("discarding unknown line msg %s", value["line"])
-        elif "TURNSTILE_SUMMARY" == message.topic():
-            self.green_line.process_message(message)
-            self.red_line.process_message(message)
-            self.blue_line.process_message(message)
-        else:
-            logger.info("ignoring non-lines message %s", message.topic())
+        """Processes a station, arrival or turnstile summary message"""
+        topic = message.topic()
+        handler = self._routes.get(topic)
+        if handler is None:
+            handler = self._routes[topic] = self._route(topic)
+        handler(message.value())
+
+    def process_messages(self, messages):
+        """Processes a batch of messages. A message that fails does not stop the rest of the batch"""
+        for message in messages:
+            try:
+                self.process_message(message)
+            except Exception:
+                logger.exception("Exception raised while processing a message of topic %s", message.topic())
+
+    def _handle_station(self, value):
+        value = json.loads(value)
+        color = value["line"]
+        if color is None or color == "unknown":
+            logger.debug("discarding unknown line msg %s", color)
+            return
+
+        station = self._line(color).add_station(value)
+        self.stations.setdefault(value["station_id"], {})[color] = station
+        self._changed(color, [station])
+
+    def _handle_arrival(self, value):
+        color = value["line"]
+        if color is None or color == "unknown":
+            logger.debug("discarding unknown line msg %s", color)
+            return
+        changed = self._line(color).handle_arrival(value)
+        if changed:
+            self._changed(color, changed)
+
+    def _handle_turnstile_summary(self, value):
+        json_data = json.loads(value)
+        stations = self.stations.get(json_data.get("STATION_ID"))
+        if stations is None:
+            logger.debug("unable to handle message due to missing station")
+            return
+        for color, station in stations.items():
+            station.process_message(json_data)
+            self._changed(color, [station])
@@ -14,11 +14,19 @@ class Weather:
         """Creates the weather model"""
         self.temperature = 70.0
         self.status = "sunny"
+        # Increases on every change, so the status page is only rendered again when needed
+        self.version = 0
+        # Called without arguments whenever the weather changed
+        self.listeners = []
 
     def process_message(self, message):
         """Handles incoming weather data"""
 
         value = message.value()
 
-        self.temperature = value["temperature"]
-        self.status = value["status"]
+        if (value["temperature"], value["status"]) != (self.temperature, self.status):
+            self.temperature = value["temperature"]
+            self.status = value["status"]
+            self.version += 1
+            for listener in self.listeners:
+                listener()
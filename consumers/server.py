@@ -1,11 +1,17 @@
 """Defines a Tornado Server that consumes Kafka Event data for display"""
+import gzip
+import json
 import logging
 import logging.config
+import time
+import uuid
+from os import environ
 from pathlib import Path
 
 import tornado.ioloop
 import tornado.template
 import tornado.web
+import tornado.websocket
 
 
 # Import logging before models to ensure configuration is picked up
@@ -13,34 +19,378 @@ logging.config.fileConfig(f"{Path(__file__).parents[0]}/logging.ini")
 
 
 from consumer import KafkaConsumer
-from models import Lines, Weather
+from models import ARRIVAL_TOPIC_PATTERN, ChangeLog, Lines, Weather
 import topic_check
 
 
 logger = logging.getLogger(__name__)
 
 
-class MainHandler(tornado.web.RequestHandler):
-    """Defines a web request handler class"""
+class StatusPage:
+    """Renders the status page once per version of the weather and lines models"""
 
     template_dir = tornado.template.Loader(f"{Path(__file__).parents[0]}/templates")
     template = template_dir.load("status.html")
 
-    def initialize(self, weather, lines):
-        """Initializes the handler with required configuration"""
+    def __init__(self, weather, lines):
+        """Creates the page of the given models"""
         self.weather = weather
         self.lines = lines
+        # Versions start over with the server, the ETags of a previous run must not match
+        self._instance = uuid.uuid4().hex[:12]
+        self._etag = None
+        self._body = None
+        self._gzip_body = None
+
+    @property
+    def etag(self):
+        """Returns the ETag of the current versions of the models"""
+        # Weak, the gzip and identity bodies are the same page
+        return f'W/"{self._instance}-{self.weather.version}-{self.lines.version}"'
+
+    def render(self):
+        """Returns the ETag, body and gzip compressed body of the page, rendered again only if the
+        models changed since the last call"""
+        etag = self.etag
+        if etag != self._etag:
+            body = StatusPage.template.generate(weather=self.weather, lines=self.lines)
+            self._etag, self._body, self._gzip_body = etag, body, gzip.compress(body, compresslevel=6)
+        return self._etag, self._body, self._gzip_body
+
+
+class MainHandler(tornado.web.RequestHandler):
+    """Defines a web request handler class"""
+
+    def initialize(self, page):
+        """Initializes the handler with required configuration"""
+        self.page = page
 
     def get(self):
         """Responds to get requests"""
         logging.debug("rendering and writing handler template")
 
         try:
-            self.write(
-                MainHandler.template.generate(weather=self.weather, lines=self.lines)
-            )
+            etag, body, gzip_body = self.page.render()
         except:
             logger.exception("Exception raised rendering template")
+            return
+
+        write_cached(self, etag, body, gzip_body)
+
+
+def write_cached(handler, etag, body, gzip_body):
+    """Responds with 304 when the client has the given ETag, else with the body, gzip compressed if
+    the client accepts it"""
+    handler.set_header("Etag", etag)
+    handler.set_header("Vary", "Accept-Encoding")
+    # Cached, but revalidated by the client on every request
+    handler.set_header("Cache-Control", "no-cache")
+    if handler.check_etag_header():
+        handler.set_status(304)
+        return
+
+    if "gzip" in handler.request.headers.get("Accept-Encoding", ""):
+        handler.set_header("Content-Encoding", "gzip")
+        handler.write(gzip_body)
+    else:
+        handler.write(body)
+
+
+class LiveUpdates:
+    """Streams the changes of the weather and lines models to the WebSocket clients of the status
+    page. Changes are coalesced per flush: a station changed many times since the last flush is
+    sent once, with its current state"""
+
+    # Seconds between flushes
+    FLUSH_SECS = float(environ.get("LIVE_FLUSH_SECS") or "1.0")
+    # Seconds a client may take to receive an update before it is disconnected
+    MAX_LAG_SECS = float(environ.get("LIVE_MAX_LAG_SECS") or "30.0")
+    # Whether updates are compressed with permessage-deflate for the clients supporting it. It
+    # saves bandwidth but costs CPU per client, which delays the flushes with many clients
+    COMPRESSION = (environ.get("LIVE_COMPRESSION") or "false").lower() in ("1", "true", "yes")
+
+    def __init__(self, weather, lines, flush_secs=None, max_lag_secs=None, compression=None):
+        """Creates the updates of the given models and starts listening to their changes"""
+        self.weather = weather
+        self.lines = lines
+        self.flush_secs = flush_secs or LiveUpdates.FLUSH_SECS
+        self.max_lag_secs = max_lag_secs or LiveUpdates.MAX_LAG_SECS
+        self.compression = LiveUpdates.COMPRESSION if compression is None else compression
+        self.clients = set()
+        # (color, station_id) of the stations changed since the last flush
+        self._changed_stations = set()
+        self._weather_changed = False
+        self._snapshot_versions = None
+        self._snapshot = None
+        self._callback = tornado.ioloop.PeriodicCallback(self.flush, 1000 * self.flush_secs)
+
+        weather.listeners.append(self._on_weather_changed)
+        lines.listeners.append(self._on_station_changed)
+
+    def start(self):
+        """Starts flushing the changes every flush_secs"""
+        self._callback.start()
+
+    def stop(self):
+        """Stops flushing the changes"""
+        self._callback.stop()
+
+    def _on_weather_changed(self):
+        self._weather_changed = True
+
+    def _on_station_changed(self, color, station_id):
+        self._changed_stations.add((color, station_id))
+
+    def _weather_update(self):
+        return [int(self.weather.temperature), self.weather.status]
+
+    def _station_update(self, color, station_id):
+        """Returns a station as [color, station id, train in direction a, in direction b, turnstile
+        entries]"""
+        station = self.lines.lines[color].stations[station_id]
+        return [
+            color,
+            station_id,
+            station.dir_a["train_id"] if station.dir_a is not None else None,
+            station.dir_b["train_id"] if station.dir_b is not None else None,
+            station.num_turnstile_entries,
+        ]
+
+    @staticmethod
+    def _encode(update):
+        return json.dumps(update, separators=(",", ":")).encode("utf-8")
+
+    def snapshot(self):
+        """Returns the encoded update of every station and the weather, encoded once per version of
+        the models"""
+        versions = (self.weather.version, self.lines.version)
+        if versions != self._snapshot_versions:
+            self._snapshot_versions = versions
+            self._snapshot = LiveUpdates._encode({
+                "weather": self._weather_update(),
+                "stations": [
+                    self._station_update(color, station.station_id)
+                    for color, line in self.lines.lines.items()
+                    for station in line.ordered_stations
+                ],
+            })
+        return self._snapshot
+
+    def add_client(self, client):
+        """Adds a client, which first receives the snapshot"""
+        self.clients.add(client)
+        client.send(self.snapshot())
+
+    def remove_client(self, client):
+        self.clients.discard(client)
+
+    def flush(self):
+        """Sends the changes since the last flush to every client. A client still receiving a
+        previous update is skipped and receives the snapshot once it caught up, so no more than one
+        update is ever buffered per client"""
+        delta = None
+        if self._weather_changed or self._changed_stations:
+            update = {"stations": [self._station_update(*key) for key in self._changed_stations]}
+            if self._weather_changed:
+                update["weather"] = self._weather_update()
+            delta = LiveUpdates._encode(update)
+            self._changed_stations = set()
+            self._weather_changed = False
+
+        now = time.monotonic()
+        for client in list(self.clients):
+            if client.is_sending():
+                if now - client.sent_at > self.max_lag_secs:
+                    logger.info("closing live updates client lagging for %.1f seconds", now - client.sent_at)
+                    self.remove_client(client)
+                    client.close()
+                elif delta is not None:
+                    client.missed_updates = True
+            elif client.missed_updates:
+                client.send(self.snapshot())
+            elif delta is not None:
+                client.send(delta)
+
+
+class LiveHandler(tornado.websocket.WebSocketHandler):
+    """Streams the changes of the status page over a WebSocket"""
+
+    def initialize(self, live):
+        """Initializes the handler with required configuration"""
+        self.live = live
+        self.sent_at = None
+        self.missed_updates = False
+        self._sending = None
+
+    def open(self):
+        self.live.add_client(self)
+
+    def on_close(self):
+        self.live.remove_client(self)
+
+    def on_message(self, message):
+        """Ignores messages, clients only receive updates"""
+
+    def get_compression_options(self):
+        """Enables permessage-deflate for the clients supporting it when the updates are compressed"""
+        return {} if self.live.compression else None
+
+    def is_sending(self):
+        """Returns whether the last update is still waiting to be written to the socket"""
+        return self._sending is not None and not self._sending.done()
+
+    def send(self, update):
+        """Writes an encoded update"""
+        self.missed_updates = False
+        self.sent_at = time.monotonic()
+        try:
+            self._sending = self.write_message(update)
+        except tornado.websocket.WebSocketClosedError:
+            self.live.remove_client(self)
+
+
+class StateApi:
+    """Serves the state of the weather and lines models as JSON: a snapshot of everything, or the
+    entities changed since a version of the change log"""
+
+    def __init__(self, weather, lines, change_log=None):
+        """Creates the API of the given models and starts recording their changes"""
+        self.weather = weather
+        self.lines = lines
+        self.change_log = change_log or ChangeLog()
+        # Versions start over with the server, versions of a previous run are not diffed against
+        self.instance = uuid.uuid4().hex[:12]
+        self._snapshot_version = None
+        self._snapshot = None
+
+        weather.listeners.append(lambda: self.change_log.record(("weather",)))
+        lines.listeners.append(lambda color, station_id: self.change_log.record(("station", color, station_id)))
+
+    def _weather(self):
+        return {"temperature": self.weather.temperature, "status": self.weather.status}
+
+    def _station(self, color, station):
+        return {
+            "line": color,
+            "station_id": station.station_id,
+            "station_name": station.station_name,
+            "order": station.order,
+            "dir_a": station.dir_a,
+            "dir_b": station.dir_b,
+            "num_turnstile_entries": station.num_turnstile_entries,
+        }
+
+    def _trains(self, color, station):
+        """Returns the trains at a station"""
+        return [
+            {
+                "train_id": train["train_id"],
+                "line": color,
+                "station_id": station.station_id,
+                "direction": direction,
+                "status": train["status"],
+            }
+            for direction, train in (("a", station.dir_a), ("b", station.dir_b))
+            if train is not None
+        ]
+
+    @staticmethod
+    def _encode(state):
+        return json.dumps(state, separators=(",", ":")).encode("utf-8")
+
+    def snapshot(self):
+        """Returns the ETag, body and gzip compressed body of the snapshot, encoded once per version"""
+        if self.change_log.version != self._snapshot_version:
+            stations = []
+            trains = []
+            for color, line in self.lines.lines.items():
+                for station in line.ordered_stations:
+                    stations.append(self._station(color, station))
+                    trains.extend(self._trains(color, station))
+            body = StateApi._encode({
+                "instance": self.instance,
+                "version": self.change_log.version,
+                "snapshot": True,
+                "weather": self._weather(),
+                "lines": [
+                    {"color": color, "color_code": line.color_code} for color, line in self.lines.lines.items()
+                ],
+                "stations": stations,
+                "trains": trains,
+            })
+            self._snapshot_version = self.change_log.version
+            self._snapshot = (
+                f'W/"{self.instance}-{self.change_log.version}"', body, gzip.compress(body, compresslevel=6)
+            )
+        return self._snapshot
+
+    def changes(self, since, instance=None):
+        """Returns the encoded entities changed after the given version, or None when only a
+        snapshot can bring the client up to date. The trains are the ones at the changed stations,
+        which replace the trains the client had at those stations: a train that departed is at
+        none of them anymore"""
+        keys = self.change_log.changed_since(since) if instance in (None, self.instance) else None
+        if keys is None:
+            return None
+
+        changes = {
+            "instance": self.instance,
+            "version": self.change_log.version,
+            "since": since,
+            "snapshot": False,
+            "stations": [],
+            "trains": [],
+        }
+        for key in keys:
+            if key[0] == "weather":
+                changes["weather"] = self._weather()
+            else:
+                _, color, station_id = key
+                station = self.lines.lines[color].stations[station_id]
+                changes["stations"].append(self._station(color, station))
+                changes["trains"].extend(self._trains(color, station))
+        return StateApi._encode(changes)
+
+
+class StateHandler(tornado.web.RequestHandler):
+    """Responds with the snapshot of the state as JSON"""
+
+    def initialize(self, api):
+        """Initializes the handler with required configuration"""
+        self.api = api
+
+    def get(self):
+        self.set_header("Content-Type", "application/json")
+        write_cached(self, *self.api.snapshot())
+
+
+class ChangesHandler(tornado.web.RequestHandler):
+    """Responds with the entities changed since the version of the "since" argument as JSON, or
+    with the snapshot when the change log does not go back that far, or "instance" is not the one
+    of this server"""
+
+    def initialize(self, api):
+        """Initializes the handler with required configuration"""
+        self.api = api
+
+    def get(self):
+        try:
+            since = int(self.get_argument("since"))
+        except ValueError:
+            raise tornado.web.HTTPError(400, "since must be a version number")
+
+        self.set_header("Content-Type", "application/json")
+        changes = self.api.changes(since, self.get_argument("instance", None))
+        if changes is None:
+            write_cached(self, *self.api.snapshot())
+            return
+
+        self.set_header("Vary", "Accept-Encoding")
+        if "gzip" in self.request.headers.get("Accept-Encoding", ""):
+            self.set_header("Content-Encoding", "gzip")
+            self.write(gzip.compress(changes, compresslevel=6))
+        else:
+            self.write(changes)
 
 
 def run_server():
@@ -58,11 +408,19 @@ def run_server():
 
     weather_model = Weather()
     lines = Lines()
+    live = LiveUpdates(weather_model, lines)
+    api = StateApi(weather_model, lines)
 
     application = tornado.web.Application(
-        [(r"/", MainHandler, {"weather": weather_model, "lines": lines})]
+        [
+            (r"/", MainHandler, {"page": StatusPage(weather_model, lines)}),
+            (r"/live", LiveHandler, {"live": live}),
+            (r"/api/state", StateHandler, {"api": api}),
+            (r"/api/changes", ChangesHandler, {"api": api}),
+        ]
     )
     application.listen(8888)
+    live.start()
 
     # Build kafka consumers
     consumers = [
@@ -74,17 +432,20 @@ def run_server():
         KafkaConsumer(
             "com.udacity.nd029.p1.v1.transformedstations",
             lines.process_message,
+            batch_handler=lines.process_messages,
             offset_earliest=True,
             is_avro=False,
         ),
         KafkaConsumer(
-            "^com.udacity.nd029.p1.v1.arrival..*$",
+            ARRIVAL_TOPIC_PATTERN.pattern,
             lines.process_message,
+            batch_handler=lines.process_messages,
             offset_earliest=True,
         ),
         KafkaConsumer(
             "TURNSTILE_SUMMARY",
             lines.process_message,
+            batch_handler=lines.process_messages,
             offset_earliest=True,
             is_avro=False,
         ),
@@ -101,6 +462,7 @@ def run_server():
     except KeyboardInterrupt as e:
         logger.info("shutting down server")
         tornado.ioloop.IOLoop.current().stop()
+        live.stop()
         for consumer in consumers:
             consumer.close()
 
@@ -1,8 +1,32 @@
+import time
+
+from os import environ
+from typing import Optional
+
 from confluent_kafka.admin import AdminClient
 
 
-def topic_exists(topic):
+# Seconds a cluster metadata snapshot is reused before being fetched again
+METADATA_MAX_AGE_SECONDS = 30.0
+
+_admin_client: Optional[AdminClient] = None
+_topics_snapshot: Optional[set[str]] = None
+_topics_snapshot_time = 0.0
+
+
+def cluster_topics(refresh=False):
+    """Returns the cached snapshot of the topic names in Kafka"""
+    global _admin_client, _topics_snapshot, _topics_snapshot_time
+
+    if refresh or _topics_snapshot is None or time.monotonic() - _topics_snapshot_time > METADATA_MAX_AGE_SECONDS:
+        if _admin_client is None:
+            _admin_client = AdminClient({"bootstrap.servers": environ.get("BROKER_URL") or "PLAINTEXT://localhost:9092"})
+        _topics_snapshot = set(_admin_client.list_topics(timeout=5).topics)
+        _topics_snapshot_time = time.monotonic()
+
+    return _topics_snapshot
+
+
+def topic_exists(topic, refresh=False):
     """Checks if the given topic exists in Kafka"""
-    client = AdminClient({"bootstrap.servers": "PLAINTEXT://localhost:9092"})
-    topic_metadata = client.list_topics(timeout=5)
-    return topic in set(t.topic for t in iter(topic_metadata.topics.values()))
+    return topic in cluster_topics(refresh)
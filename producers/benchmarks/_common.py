@@ -0,0 +1,13 @@
+"""Helpers shared by the producer benchmarks"""
+
+
+def process_status(fields: tuple[str, ...] = ("VmRSS", "VmHWM")) -> dict[str, int]:
+    """Reads fields of /proc/self/status for the current process: the resident memory (in KiB) by
+    default, "Threads" for the thread count"""
+    status = {}
+    with open("/proc/self/status") as status_file:
+        for line in status_file:
+            name, _, value = line.partition(":")
+            if name in fields:
+                status[name] = int(value.split()[0])
+    return status
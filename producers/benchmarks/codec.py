@@ -0,0 +1,117 @@
+"""Measures the records per second encoded and decoded by the avro library, the serializer used by
+AvroProducer/AvroConsumer when fastavro is not installed, and by the AvroCodec.
+
+Schema ids are assigned by an in-process registry, so it runs without the Kafka stack. Run from the
+producers directory:
+
+    python -m benchmarks.codec --records 100000
+"""
+import argparse
+import io
+import json
+import struct
+import time
+
+from pathlib import Path
+
+import avro.io
+
+from confluent_kafka import avro as confluent_avro
+
+from models.avro_codec import AvroCodec
+
+
+_SCHEMAS_DIR = Path(__file__).parents[1] / "models" / "schemas"
+
+_RECORDS = {
+    "arrival_value": {
+        "station_id": 40890,
+        "train_id": "BL000",
+        "direction": "a",
+        "line": "blue",
+        "train_status": "in_service",
+        "prev_station_id": 40820,
+        "prev_direction": "a"
+    },
+    "turnstile_value": {"station_id": 40890, "station_name": "O'Hare", "line": "blue"},
+    "turnstile_aggregated_value": {"station_id": 40890, "station_name": "O'Hare", "line": "blue", "entries": 12},
+    "weather_value": {"temperature": 68.5, "status": "sunny"},
+}
+
+
+class _LocalSchemaRegistry:
+    """Assigns schema ids like the schema registry does, without the network round trip"""
+
+    def __init__(self):
+        self._ids = {}
+        self._schemas = {}
+
+    def register(self, subject, schema):
+        schema_id = self._ids.setdefault(str(schema), len(self._ids) + 1)
+        self._schemas[schema_id] = schema
+        return schema_id
+
+    def get_by_id(self, schema_id):
+        return self._schemas.get(schema_id)
+
+
+def _avro_library(schema, record, num_records: int) -> tuple[float, float]:
+    header = struct.pack(">bI", 0, 1)
+    writer = avro.io.DatumWriter(schema)
+    reader = avro.io.DatumReader(schema)
+
+    start = time.perf_counter()
+    for _ in range(num_records):
+        buffer = io.BytesIO()
+        buffer.write(header)
+        writer.write(record, avro.io.BinaryEncoder(buffer))
+        encoded = buffer.getvalue()
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(num_records):
+        buffer = io.BytesIO(encoded)
+        buffer.seek(5)
+        reader.read(avro.io.BinaryDecoder(buffer))
+    decode_seconds = time.perf_counter() - start
+
+    return encode_seconds, decode_seconds
+
+
+def _avro_codec(schema, record, num_records: int) -> tuple[float, float]:
+    codec = AvroCodec(_LocalSchemaRegistry())
+    topic = "com.udacity.nd029.p1.v1.benchmark.codec"
+
+    start = time.perf_counter()
+    for _ in range(num_records):
+        encoded = codec.encode(topic, schema, record)
+    encode_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(num_records):
+        codec.decode(encoded)
+    decode_seconds = time.perf_counter() - start
+
+    return encode_seconds, decode_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100000, help="Number of records encoded and decoded per schema")
+    args = parser.parse_args()
+
+    for schema_name, record in _RECORDS.items():
+        schema = confluent_avro.load(f"{_SCHEMAS_DIR}/{schema_name}.json")
+        for codec_name, run in (("avro", _avro_library), ("avro_codec", _avro_codec)):
+            encode_seconds, decode_seconds = run(schema, record, args.records)
+            print(json.dumps({
+                "schema": schema_name,
+                "codec": codec_name,
+                "records": args.records,
+                "encoded_per_second": args.records / encode_seconds,
+                "decoded_per_second": args.records / decode_seconds
+            }))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Compares one AvroProducer per Station/Turnstile against the process-wide shared producer.
+
+Each layout runs in its own process so memory and thread counts do not leak between them. Run from
+the producers directory with the Kafka stack up:
+
+    python -m benchmarks.producer_layout --producers 460 --events 100000
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+from os import environ
+from pathlib import Path
+
+from confluent_kafka import avro
+from confluent_kafka.avro import AvroProducer, CachedSchemaRegistryClient
+
+from benchmarks._common import process_status
+
+
+_SCHEMAS_DIR = Path(__file__).parents[1] / "models" / "schemas"
+
+_TOPIC_NAME = "com.udacity.nd029.p1.v1.benchmark.producer_layout"
+
+
+def _run_layout(layout: str, num_producers: int, num_events: int) -> dict:
+    broker_properties = {
+        "bootstrap.servers": environ.get("BROKER_URL") or "plaintext://localhost:9092",
+        "enable.idempotence": True,
+    }
+    schema_registry_url = environ.get("SCHEMA_REGISTRY_URL") or "http://localhost:8081"
+    key_schema = avro.load(f"{_SCHEMAS_DIR}/arrival_key.json")
+    value_schema = avro.load(f"{_SCHEMAS_DIR}/arrival_value.json")
+
+    start = time.perf_counter()
+    if layout == "legacy":
+        producers = [
+            AvroProducer(
+                broker_properties,
+                schema_registry=CachedSchemaRegistryClient(schema_registry_url),
+                default_key_schema=key_schema,
+                default_value_schema=value_schema
+            )
+            for _ in range(num_producers)
+        ]
+    else:
+        from models.producer_registry import ProducerRegistry
+
+        producers = [ProducerRegistry.acquire(broker_properties, schema_registry_url) for _ in range(num_producers)]
+        producers[0].register_topic(_TOPIC_NAME, key_schema, value_schema)
+    setup_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for event in range(num_events):
+        producers[event % num_producers].produce(
+            topic=_TOPIC_NAME,
+            key={"timestamp": event},
+            value={
+                "station_id": event % num_producers,
+                "train_id": "BL000",
+                "direction": "a",
+                "line": "blue",
+                "train_status": "in_service",
+                "prev_station_id": None,
+                "prev_direction": None
+            }
+        )
+    # The shared layout hands out the same producer many times, so only flush each one once
+    for producer in {id(producer): producer for producer in producers}.values():
+        producer.flush(30)
+    produce_seconds = time.perf_counter() - start
+
+    return {
+        "layout": layout,
+        "producers": num_producers,
+        "events": num_events,
+        "setup_seconds": setup_seconds,
+        "events_per_second": num_events / produce_seconds,
+        **process_status(("VmRSS", "VmHWM", "Threads"))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--producers", type=int, default=460, help="Number of Producer instances (one per Station and Turnstile)")
+    parser.add_argument("--events", type=int, default=100000, help="Number of events to produce")
+    parser.add_argument("--layout", choices=("legacy", "shared"), help="Run a single layout in this process")
+    args = parser.parse_args()
+
+    if args.layout is not None:
+        print(json.dumps(_run_layout(args.layout, args.producers, args.events)))
+        return
+
+    for layout in ("legacy", "shared"):
+        result = subprocess.run(
+            [sys.executable, "-m", "benchmarks.producer_layout", "--layout", layout,
+             "--producers", str(args.producers), "--events", str(args.events)],
+            check=True,
+            capture_output=True,
+            text=True
+        )
+        print(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Measures the throughput of the simulation ticks for different network sizes, train counts and
+numbers of worker processes.
+
+Every scenario builds a TimeSimulation that sends its events to the null sink, so no I/O is
+measured, and runs its ticks in its own process. A first pass measures ticks and events per second,
+and a second pass wraps the hot paths (Line.run stages, Station.run, Turnstile.run,
+TurnstileHardware.get_entries and the sink) to report the time spent in each of them. Times are
+inclusive: Turnstile.run includes get_entries and the sink. With more than one worker the lines run
+in the worker processes (see sharding.py), so only the first pass is run. Run from the producers
+directory:
+
+    python -m benchmarks.simulation --networks cta,10x50,30x100 --trains 10,50 --output results.json
+    python -m benchmarks.simulation --compare results.json --output new.json
+    python -m benchmarks.simulation --networks 30x100 --workers 1,2,4
+
+Networks are "cta", the network in data/, or "<lines>x<stations>" networks written by
+generate_network.py.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import defaultdict
+from os import environ
+from pathlib import Path
+from typing import Optional
+
+from benchmarks._common import process_status
+
+
+# Methods timed by the second pass, as (module, class name, method name)
+_STAGES = (
+    ("models.line", "Line", "_advance_turnstiles"),
+    ("models.line", "Line", "_advance_trains"),
+    ("models.turnstile", "Turnstile", "run"),
+    ("models.turnstile_hardware", "TurnstileHardware", "get_entries"),
+    ("models.station", "Station", "run"),
+    ("models.sinks", "NullSink", "produce"),
+)
+
+# Ticks run before measuring
+_WARMUP_TICKS = 20
+
+# Metrics compared by --compare, and whether a higher value is better
+_COMPARED_METRICS = {"ticks_per_second": True, "events_per_second": True, "VmHWM": False}
+
+
+def _instrument(stage_seconds: dict[str, float], stage_calls: dict[str, int]):
+    """Wraps the methods of _STAGES to accumulate the time spent in them"""
+    import importlib
+
+    for module_name, class_name, method_name in _STAGES:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        method = getattr(cls, method_name)
+        stage = f"{class_name}.{method_name}"
+
+        def timed(*args, _method=method, _stage=stage, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _method(*args, **kwargs)
+            finally:
+                stage_seconds[_stage] += time.perf_counter() - start
+                stage_calls[_stage] += 1
+
+        setattr(cls, method_name, timed)
+
+
+def _run_ticks(simulation, curr_time: datetime.datetime, num_ticks: int) -> tuple[float, datetime.datetime]:
+    from models.common import clock
+    from models.producer_registry import ProducerRegistry
+
+    start = time.perf_counter()
+    for _ in range(num_ticks):
+        clock.set_time(curr_time)
+        _ = [line.run(curr_time, simulation.time_step) for line in simulation.train_lines]
+        ProducerRegistry.service()
+        curr_time = curr_time + simulation.time_step
+    return time.perf_counter() - start, curr_time
+
+
+def _produced(simulation) -> int:
+    from models.producer_registry import ProducerRegistry
+    from sharding import ShardedLines
+
+    produced = sum(stats.produced for stats in ProducerRegistry.stats().values())
+    for line in simulation.train_lines:
+        if isinstance(line, ShardedLines):
+            produced += sum(line.produced().values())
+    return produced
+
+
+def _run_scenario(network: str, num_trains: int, num_ticks: int, data_dir: Optional[str], workers: int) -> dict:
+    # The null sink is picked up by the ProducerRegistry when the models are imported
+    environ["PRODUCER_SINK"] = "null"
+    from simulation import TimeSimulation
+
+    start = time.perf_counter()
+    simulation = TimeSimulation(
+        virtual_clock=True,
+        start_time=datetime.datetime(2026, 1, 5),
+        seed=0,
+        num_trains=num_trains,
+        workers=workers,
+        data_dir=Path(data_dir) if data_dir else None
+    )
+    setup_seconds = time.perf_counter() - start
+    num_lines = len(simulation.network_data.lines)
+    num_stations = sum(len(stations) for stations in simulation.network_data.lines.values())
+
+    # Warm up before measuring. Initial arrivals are emitted by the constructor, so events are
+    # counted from here
+    _, curr_time = _run_ticks(simulation, simulation.start_time, _WARMUP_TICKS)
+    produced = _produced(simulation)
+
+    tick_seconds, curr_time = _run_ticks(simulation, curr_time, num_ticks)
+    num_events = _produced(simulation) - produced
+
+    stage_seconds: dict[str, float] = defaultdict(float)
+    stage_calls: dict[str, int] = defaultdict(int)
+    instrumented_seconds = 1.0
+    if workers == 1:
+        _instrument(stage_seconds, stage_calls)
+        instrumented_seconds, _ = _run_ticks(simulation, curr_time, num_ticks)
+    for line in simulation.train_lines:
+        line.close()
+
+    return {
+        "network": network,
+        "lines": num_lines,
+        "stations": num_stations,
+        "trains_per_line": num_trains,
+        "workers": workers,
+        "ticks": num_ticks,
+        "events": num_events,
+        "setup_seconds": setup_seconds,
+        "ticks_per_second": num_ticks / tick_seconds,
+        "events_per_second": num_events / tick_seconds,
+        "stages": {
+            stage: {
+                "seconds_per_tick": stage_seconds[stage] / num_ticks,
+                "share": stage_seconds[stage] / instrumented_seconds,
+                "calls_per_tick": stage_calls[stage] / num_ticks
+            }
+            for stage in stage_seconds
+        },
+        **process_status()
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(baseline: dict, results: dict):
+    """Prints the change of every compared metric of the scenarios found in both results"""
+    def key(scenario):
+        # Results written before the workers dimension ran a single process
+        return scenario["network"], scenario["trains_per_line"], scenario.get("workers", 1)
+
+    baseline_scenarios = {key(scenario): scenario for scenario in baseline["scenarios"]}
+    for scenario in results["scenarios"]:
+        previous = baseline_scenarios.get(key(scenario))
+        if previous is None:
+            continue
+        for metric, higher_is_better in _COMPARED_METRICS.items():
+            change = scenario[metric] / previous[metric] - 1.0
+            improved = (change > 0) == higher_is_better
+            print(json.dumps({
+                "network": scenario["network"],
+                "trains_per_line": scenario["trains_per_line"],
+                "workers": scenario["workers"],
+                "metric": metric,
+                "baseline": previous[metric],
+                "current": scenario[metric],
+                "change": change,
+                "improved": improved
+            }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--networks", default="cta,10x50", help="Comma separated networks, 'cta' or '<lines>x<stations>'")
+    parser.add_argument("--trains", default="10", help="Comma separated number of trains per line")
+    parser.add_argument("--ticks", type=int, default=200, help="Number of ticks measured per scenario")
+    parser.add_argument("--workers", default="1", help="Comma separated number of worker processes")
+    parser.add_argument("--output", type=Path, help="File the results are written to as JSON")
+    parser.add_argument("--compare", type=Path, help="Results of a previous run to compare against")
+    parser.add_argument("--scenario", help="Run a single network in this process")
+    parser.add_argument("--data-dir", help="Data directory of the single network")
+    args = parser.parse_args()
+
+    if args.scenario is not None:
+        print(json.dumps(_run_scenario(args.scenario, int(args.trains), args.ticks, args.data_dir, int(args.workers))))
+        return
+
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "scenarios": []
+    }
+
+    with tempfile.TemporaryDirectory() as networks_dir:
+        for network in args.networks.split(","):
+            command = [sys.executable, "-m", "benchmarks.simulation", "--scenario", network, "--ticks", str(args.ticks)]
+            if network != "cta":
+                from generate_network import generate_network
+
+                num_lines, num_stations = (int(value) for value in network.split("x"))
+                data_dir = Path(networks_dir) / network
+                generate_network(data_dir, num_lines, num_stations, seed=0)
+                command += ["--data-dir", str(data_dir)]
+
+            for num_trains in args.trains.split(","):
+                for workers in args.workers.split(","):
+                    result = subprocess.run(
+                        command + ["--trains", num_trains, "--workers", workers],
+                        check=True,
+                        capture_output=True,
+                        text=True
+                    )
+                    scenario = json.loads(result.stdout.strip().splitlines()[-1])
+                    results["scenarios"].append(scenario)
+                    print(json.dumps({key: value for key, value in scenario.items() if key != "stages"}))
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(results, indent=2))
+
+    if args.compare is not None:
+        _compare(json.loads(args.compare.read_text()), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Compares the time and memory it takes to load the station topology and ridership tables.
+
+"pandas" is the loader the simulation used before network_data.py: the CSV files are read with pandas
+and every line is filtered per station. "csv" parses the CSV files and writes the cache, like the first
+start does, and "cache" loads the cache written by it. Each loader runs in its own process, so
+imports and memory do not leak between them. Run from the producers directory:
+
+    python -m benchmarks.startup
+
+The "pandas" loader requires pandas, which the simulation no longer depends on.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+from benchmarks._common import process_status
+
+
+_DATA_DIR = Path(__file__).parents[1] / "data"
+
+_COLORS = ("blue", "green", "red")
+
+
+def _load_pandas():
+    import pandas as pd
+
+    raw_df = pd.read_csv(f"{_DATA_DIR}/cta_stations.csv").sort_values("order")
+    lines = {}
+    for color in _COLORS:
+        station_df = raw_df[raw_df[color]]
+        lines[color] = [
+            (station_df[station_df["station_name"] == station_name]["station_id"].unique()[0], station_name)
+            for station_name in station_df["station_name"].unique()
+        ]
+    seed_df = pd.read_csv(f"{_DATA_DIR}/ridership_seed.csv").drop_duplicates("station_id", keep="first")
+    curve_df = pd.read_csv(f"{_DATA_DIR}/ridership_curve.csv").sort_values("hour")
+    return lines, seed_df, curve_df
+
+
+def _run_loader(loader: str, cache_dir: str) -> dict:
+    start = time.perf_counter()
+    if loader == "pandas":
+        _load_pandas()
+    else:
+        from models.network_data import load_network_data
+
+        load_network_data(cache_dir=Path(cache_dir))
+    load_seconds = time.perf_counter() - start
+
+    return {
+        "loader": loader,
+        "load_seconds": load_seconds,
+        "pandas_imported": "pandas" in sys.modules,
+        **process_status()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--loader", choices=("pandas", "csv", "cache"), help="Run a single loader in this process")
+    parser.add_argument("--cache-dir", help="Cache directory used by the csv and cache loaders")
+    args = parser.parse_args()
+
+    if args.loader is not None:
+        print(json.dumps(_run_loader(args.loader, args.cache_dir)))
+        return
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # "csv" starts with an empty cache directory and "cache" reuses what it wrote
+        for loader in ("pandas", "csv", "cache"):
+            result = subprocess.run(
+                [sys.executable, "-m", "benchmarks.startup", "--loader", loader, "--cache-dir", cache_dir],
+                check=True,
+                capture_output=True,
+                text=True
+            )
+            print(result.stdout.strip().splitlines()[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""Loads the station reference data straight from cta_stations.csv into Kafka.
+
+It is an alternative to load_stations.sql, Postgres and the JDBC source connector (see connector.py):
+every row of the CSV file is produced to the stations topic as the JSON object the connector emits,
+without a key and with the columns of the stations table. The stop ids already in the topic are
+read first and skipped, so reruns, or runs after the connector loaded the table, produce nothing.
+
+Networks written by generate_network.py have other lines than red, blue and green. Their rows carry
+the flags of the CTA lines as false and an additional "line" field with the name of their line,
+which faust_stream.py uses instead of the flags. Run from the producers directory:
+
+    python bootstrap_stations.py
+    python bootstrap_stations.py --data-dir networks/large
+"""
+import argparse
+import csv
+import json
+import logging
+import logging.config
+import uuid
+
+from os import environ
+from pathlib import Path
+from typing import Any, Final, Optional
+
+from confluent_kafka import Consumer, KafkaError, KafkaException, Producer, TopicPartition
+from confluent_kafka.admin import AdminClient, NewTopic
+
+from models.network_data import DATA_DIR
+
+
+logger = logging.getLogger(__name__)
+
+
+STATIONS_TOPIC_NAME: Final[str] = "com.udacity.nd029.p1.v1.stations"
+
+# Lines with a column in the stations table (see load_stations.sql)
+_CTA_COLORS: Final[tuple[str, ...]] = ("red", "blue", "green")
+
+
+def read_stations(path: Path) -> list[dict[str, Any]]:
+    """Returns the rows of a cta_stations.csv file as the values the JDBC connector produces"""
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.DictReader(csv_file)
+        colors = reader.fieldnames[reader.fieldnames.index("order") + 1:]
+        other_colors = [color for color in colors if color not in _CTA_COLORS]
+
+        stations = []
+        for row in reader:
+            station = {
+                "stop_id": int(row["stop_id"]),
+                "direction_id": row["direction_id"],
+                "stop_name": row["stop_name"],
+                "station_name": row["station_name"],
+                "station_descriptive_name": row["station_descriptive_name"],
+                "station_id": int(row["station_id"]),
+                "order": int(row["order"]) if row["order"] else None,
+                **{color: row.get(color, "FALSE").upper() == "TRUE" for color in _CTA_COLORS}
+            }
+            if other_colors:
+                lines = [color for color in other_colors if row[color].upper() == "TRUE"]
+                station["line"] = lines[0] if len(lines) == 1 else None
+            stations.append(station)
+    return stations
+
+
+def _ensure_topic(admin_client: AdminClient):
+    if STATIONS_TOPIC_NAME in admin_client.list_topics(timeout=10).topics:
+        return
+
+    # Same layout as the topic the connector creates
+    future = admin_client.create_topics(
+        [NewTopic(STATIONS_TOPIC_NAME, num_partitions=1, replication_factor=1)], operation_timeout=5.0
+    )[STATIONS_TOPIC_NAME]
+    try:
+        future.result()
+        logger.info("Created topic '%s'", STATIONS_TOPIC_NAME)
+    except KafkaException as e:
+        if e.args[0].code() != KafkaError.TOPIC_ALREADY_EXISTS:
+            raise e
+
+
+def _existing_stop_ids(broker_url: str, admin_client: AdminClient) -> set[int]:
+    """Reads the stop ids already in the stations topic, up to its current end"""
+    topic_metadata = admin_client.list_topics(STATIONS_TOPIC_NAME, timeout=10).topics[STATIONS_TOPIC_NAME]
+    consumer = Consumer({
+        "bootstrap.servers": broker_url,
+        # A throwaway group, the offsets are never committed
+        "group.id": f"bootstrap-stations-{uuid.uuid4()}",
+        "enable.auto.commit": False
+    })
+    try:
+        assignment = []
+        end_offsets = {}
+        for partition in topic_metadata.partitions:
+            low, high = consumer.get_watermark_offsets(TopicPartition(STATIONS_TOPIC_NAME, partition), timeout=10)
+            if high > low:
+                assignment.append(TopicPartition(STATIONS_TOPIC_NAME, partition, low))
+                end_offsets[partition] = high
+        consumer.assign(assignment)
+
+        stop_ids = set()
+        while end_offsets:
+            for message in consumer.consume(num_messages=500, timeout=1.0):
+                if message.error() is not None:
+                    raise KafkaException(message.error())
+                if message.value():
+                    stop_ids.add(json.loads(message.value())["stop_id"])
+            positions = consumer.position([TopicPartition(STATIONS_TOPIC_NAME, partition) for partition in end_offsets])
+            for position in positions:
+                if position.offset >= end_offsets[position.partition]:
+                    del end_offsets[position.partition]
+        return stop_ids
+    finally:
+        consumer.close()
+
+
+def bootstrap_stations(data_dir: Optional[Path] = None, broker_url: Optional[str] = None) -> int:
+    """Produces the stations of data_dir missing from the stations topic. Returns how many were
+    produced"""
+    data_dir = Path(data_dir or DATA_DIR)
+    broker_url = broker_url or environ.get("BROKER_URL") or "plaintext://localhost:9092"
+
+    stations = read_stations(data_dir / "cta_stations.csv")
+
+    admin_client = AdminClient({"bootstrap.servers": broker_url})
+    _ensure_topic(admin_client)
+    existing_stop_ids = _existing_stop_ids(broker_url, admin_client)
+    missing_stations = [station for station in stations if station["stop_id"] not in existing_stop_ids]
+
+    logger.info(
+        "Bootstrapping stations from %s. stations: %d, already in the topic: %d",
+        data_dir, len(stations), len(stations) - len(missing_stations)
+    )
+    if not missing_stations:
+        return 0
+
+    failed = []
+
+    def on_delivery(error, message):
+        if error is not None:
+            failed.append(error)
+
+    producer = Producer({"bootstrap.servers": broker_url, "enable.idempotence": True, "linger.ms": 50})
+    # Produced in stop id order, like the incrementing mode of the connector
+    for station in sorted(missing_stations, key=lambda station: station["stop_id"]):
+        while True:
+            try:
+                producer.produce(STATIONS_TOPIC_NAME, value=json.dumps(station), on_delivery=on_delivery)
+                break
+            except BufferError:
+                producer.poll(0.1)
+        producer.poll(0)
+
+    remaining = producer.flush(30)
+    if failed or remaining:
+        raise RuntimeError(f"Unable to deliver {len(failed) + remaining} stations: {failed[:1]}")
+
+    logger.info("Produced %d stations to '%s'", len(missing_stations), STATIONS_TOPIC_NAME)
+    return len(missing_stations)
+
+
+if __name__ == "__main__":
+    logging.config.fileConfig(f"{Path(__file__).parents[0]}/logging.ini")
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=DATA_DIR,
+        help="Directory with the cta_stations.csv file, producers/data by default"
+    )
+    args = parser.parse_args()
+
+    bootstrap_stations(args.data_dir)
@@ -0,0 +1,134 @@
+"""Generates synthetic transit networks to test the pipeline at scale.
+
+The network is written in the formats of the files in data/: cta_stations.csv with a column per line,
+ridership_seed.csv with the average rides of every station, and a copy of ridership_curve.csv. The
+ridership of each station is drawn from the distribution of the CTA stations: weekday rides follow a
+log-normal fitted to them, and the saturday and sunday rides keep the ratio to the weekday of a
+randomly picked CTA station.
+
+Run from the producers directory and point the simulation at the output:
+
+    python generate_network.py --lines 30 --stations 100 --output-dir networks/large
+    python simulation.py --data-dir networks/large
+"""
+import argparse
+import csv
+import logging
+import logging.config
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+# Import logging before models to ensure configuration is picked up
+logging.config.fileConfig(f"{Path(__file__).parents[0]}/logging.ini")
+
+from models.network_data import load_network_data
+
+
+logger = logging.getLogger(__name__)
+
+
+# The ridership of the generated stations follows the CTA stations
+CTA_DATA_DIR = Path(__file__).parents[0] / "data"
+
+# Ids of the generated stations and stops start here, above the ids of the CTA data
+FIRST_STATION_ID = 100000
+FIRST_STOP_ID = 200000
+
+
+def line_names(num_lines: int) -> list[str]:
+    """Returns the color names of the generated lines"""
+    width = len(str(num_lines - 1))
+    return [f"line{index:0{width}d}" for index in range(num_lines)]
+
+
+def generate_ridership(num_stations: int, rng: np.random.Generator, data_dir: Path = CTA_DATA_DIR) -> np.ndarray:
+    """Returns the (stations, day types) average rides of num_stations stations, following the
+    distribution of the stations of data_dir"""
+    seed_rides = load_network_data(data_dir).ridership_rides
+    seed_rides = seed_rides[seed_rides[:, 0] > 0]
+
+    log_weekday = np.log(seed_rides[:, 0])
+    weekday = rng.lognormal(log_weekday.mean(), log_weekday.std(), size=num_stations)
+    # Weekend rides keep the weekday ratio of a random seed station
+    weekend_ratios = seed_rides[rng.integers(0, len(seed_rides), size=num_stations)]
+    weekend_ratios = weekend_ratios[:, 1:] / weekend_ratios[:, :1]
+
+    return np.round(np.column_stack([weekday, weekday[:, np.newaxis] * weekend_ratios]), 1)
+
+
+def generate_network(
+    output_dir: Path,
+    num_lines: int,
+    num_stations: int,
+    seed: Optional[int] = None,
+    data_dir: Path = CTA_DATA_DIR
+):
+    """Writes a network of num_lines lines with num_stations stations each to output_dir"""
+    rng = np.random.default_rng(seed)
+    colors = line_names(num_lines)
+    rides = generate_ridership(num_lines * num_stations, rng, data_dir)
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(output_dir / "cta_stations.csv", "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow([
+            "stop_id", "direction_id", "stop_name", "station_name", "station_descriptive_name", "station_id", "order",
+            *colors
+        ])
+        for line_index, color in enumerate(colors):
+            flags = ["TRUE" if index == line_index else "FALSE" for index in range(num_lines)]
+            for order in range(num_stations):
+                station_index = line_index * num_stations + order
+                station_name = f"{color.title()} {order:04d}"
+                # A stop per direction, like the CTA data
+                for direction, (direction_id, bound) in enumerate((("N", "Northbound"), ("S", "Southbound"))):
+                    writer.writerow([
+                        FIRST_STOP_ID + station_index * 2 + direction,
+                        direction_id,
+                        f"{station_name} ({bound})",
+                        station_name,
+                        f"{station_name} ({color.title()} Line)",
+                        FIRST_STATION_ID + station_index,
+                        order,
+                        *flags
+                    ])
+
+    with open(output_dir / "ridership_seed.csv", "w", newline="", encoding="utf-8") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow([
+            "station_id", "stationame", "month_beginning", "avg_weekday_rides", "avg_saturday_rides",
+            "avg_sunday-holiday_rides", "monthtotal"
+        ])
+        for station_index, (weekday, saturday, sunday) in enumerate(rides.tolist()):
+            color = colors[station_index // num_stations]
+            writer.writerow([
+                FIRST_STATION_ID + station_index,
+                f"{color.title()} {station_index % num_stations:04d}",
+                "10/01/2018",
+                weekday,
+                saturday,
+                sunday,
+                # A month has about 22 weekdays, 4 saturdays and 5 sundays and holidays
+                int(weekday * 22 + saturday * 4 + sunday * 5)
+            ])
+
+    shutil.copyfile(data_dir / "ridership_curve.csv", output_dir / "ridership_curve.csv")
+
+    logger.info(
+        "Wrote a network of %d lines and %d stations to %s", num_lines, num_lines * num_stations, output_dir
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a synthetic transit network")
+    parser.add_argument("--lines", type=int, required=True, help="Number of lines")
+    parser.add_argument("--stations", type=int, required=True, help="Number of stations per line")
+    parser.add_argument("--output-dir", type=Path, required=True, help="Directory the CSV files are written to")
+    parser.add_argument("--seed", type=int, help="Seed of the ridership randomness, for reproducible networks")
+    args = parser.parse_args()
+
+    generate_network(args.output_dir, args.lines, args.stations, args.seed)
@@ -0,0 +1,97 @@
+"""Avro serialization in the Confluent wire format, backed by fastavro.
+
+Every schema is registered and parsed once. The parsed schema and the wire format header (the magic
+byte and the 4-byte registry id) are cached, so encoding a record only runs the compiled fastavro
+writer.
+"""
+import io
+import json
+import struct
+
+from typing import Any, Final, Optional, TYPE_CHECKING
+
+from confluent_kafka.avro import CachedSchemaRegistryClient
+from confluent_kafka.avro.serializer import KeySerializerError, SerializerError, ValueSerializerError
+from fastavro import parse_schema, schemaless_reader, schemaless_writer
+
+if TYPE_CHECKING:
+    from avro.schema import RecordSchema
+
+
+MAGIC_BYTE: Final[int] = 0
+
+_HEADER: Final[struct.Struct] = struct.Struct(">bI")
+
+
+class AvroCodec:
+    """Encodes records with the schemas registered for each topic and decodes them with the schemas
+    they were written with, looked up by registry id"""
+
+    def __init__(self, schema_registry: CachedSchemaRegistryClient):
+        self.schema_registry = schema_registry
+        # (subject, id of the schema object) -> (schema, header, parsed schema). The schema is kept
+        # so its id is not reused while cached. Hashing avro schemas serializes them, so they are
+        # not used as keys
+        self._writers: dict[tuple[str, int], tuple["RecordSchema", bytes, dict]] = {}
+        # registry id -> parsed schema
+        self._readers: dict[int, dict] = {}
+
+    @staticmethod
+    def parse(schema: "RecordSchema") -> dict:
+        """Parses an avro library schema into a fastavro one"""
+        return parse_schema(json.loads(str(schema)))
+
+    def _writer(self, topic: str, schema: "RecordSchema", is_key: bool) -> tuple["RecordSchema", bytes, dict]:
+        subject = f"{topic}-key" if is_key else f"{topic}-value"
+        writer = self._writers.get((subject, id(schema)))
+
+        if writer is None:
+            schema_id = self.schema_registry.register(subject, schema)
+            if not schema_id:
+                serializer_error = KeySerializerError if is_key else ValueSerializerError
+                raise serializer_error(f"Unable to retrieve schema id for subject {subject}")
+            writer = (schema, _HEADER.pack(MAGIC_BYTE, schema_id), AvroCodec.parse(schema))
+            self._writers[(subject, id(schema))] = writer
+            self._readers.setdefault(schema_id, writer[2])
+
+        return writer
+
+    def encode(self, topic: str, schema: "RecordSchema", record: Any, is_key: bool = False) -> Optional[bytes]:
+        """Encodes a record with the given schema, registering it for the topic the first time"""
+        if record is None:
+            return None
+
+        _, header, parsed_schema = self._writer(topic, schema, is_key)
+
+        buffer = io.BytesIO()
+        buffer.write(header)
+        try:
+            schemaless_writer(buffer, parsed_schema, record)
+        except (TypeError, ValueError) as e:
+            serializer_error = KeySerializerError if is_key else ValueSerializerError
+            raise serializer_error(f"Unable to encode record for topic {topic}: {e}") from e
+        return buffer.getvalue()
+
+    def decode(self, data: Optional[bytes]) -> Any:
+        """Decodes a record encoded in the Confluent wire format"""
+        if data is None:
+            return None
+
+        if len(data) <= _HEADER.size:
+            raise SerializerError("message is too small to decode")
+
+        magic, schema_id = _HEADER.unpack_from(data)
+        if magic != MAGIC_BYTE:
+            raise SerializerError("message does not start with magic byte")
+
+        parsed_schema = self._readers.get(schema_id)
+        if parsed_schema is None:
+            schema = self.schema_registry.get_by_id(schema_id)
+            if schema is None:
+                raise SerializerError(f"unable to fetch schema with id {schema_id}")
+            parsed_schema = AvroCodec.parse(schema)
+            self._readers[schema_id] = parsed_schema
+
+        buffer = io.BytesIO(data)
+        buffer.seek(_HEADER.size)
+        return schemaless_reader(buffer, parsed_schema)
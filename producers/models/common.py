@@ -1,9 +1,51 @@
+from datetime import datetime, timezone
+from random import Random
 from time import time
+from typing import Optional
+
+
+class SimulationClock:
+    """Source of the timestamps used as keys for Kafka Events. It follows the wall-clock unless a
+    simulated time is set, in which case every event carries the simulated time"""
+
+    def __init__(self):
+        self._virtual_millis: Optional[int] = None
+
+    @property
+    def is_virtual(self) -> bool:
+        return self._virtual_millis is not None
+
+    def set_time(self, simulated_time: datetime):
+        """Switches the clock to the given simulated time. Naive datetimes are taken as UTC"""
+        if simulated_time.tzinfo is None:
+            simulated_time = simulated_time.replace(tzinfo=timezone.utc)
+        self._virtual_millis = int(round(simulated_time.timestamp() * 1000))
+
+    def reset(self):
+        """Goes back to the wall-clock"""
+        self._virtual_millis = None
+
+    def millis(self) -> int:
+        if self._virtual_millis is not None:
+            return self._virtual_millis
+        return int(round(time() * 1000))
+
+
+clock = SimulationClock()
 
 
 def time_millis() -> int:
     """Use this function to get the key for Kafka Events"""
-    return int(round(time() * 1000))
+    return clock.millis()
+
+
+def make_rng(seed: Optional[int], *scope) -> Random:
+    """Returns an RNG stream for the given scope (e.g. "weather"). Streams derived from the same seed
+    and scope always produce the same sequence, regardless of the order they are created in. Without
+    a seed, the stream is seeded from the system entropy"""
+    if seed is None:
+        return Random()
+    return Random(":".join(str(part) for part in (seed, *scope)))
 
 
 def get_topic_safe_station_name(station_name: str) -> str:
@@ -1,8 +1,10 @@
 """Defines functionality relating to train lines"""
-import collections
+from collections import Counter
 from enum import IntEnum
 import logging
 
+import numpy as np
+
 from models import Station, Train
 
 
@@ -13,30 +15,53 @@ class Line:
     """Contains Chicago Transit Authority (CTA) Elevated Loop Train ("L") Station Data"""
 
     colors = IntEnum("colors", "blue green red", start=0)
+    # Prefix of the train ids of each line color
+    train_prefixes = {color.name: f"{color.name[0].upper()}L" for color in colors}
     num_directions = 2
 
-    def __init__(self, color, station_data, num_trains=10):
+    @classmethod
+    def use_colors(cls, color_names):
+        """Sets the line colors of the network being simulated. Train ids are prefixed with the
+        initial of their line, or with the whole color name when several lines share the initial"""
+        cls.colors = IntEnum("colors", list(color_names), start=0)
+        initials = Counter(color.name[0].upper() for color in cls.colors)
+        cls.train_prefixes = {
+            color.name: f"{color.name[0].upper()}L" if initials[color.name[0].upper()] == 1 else f"{color.name.upper()}-"
+            for color in cls.colors
+        }
+
+    def __init__(self, color, station_data, num_trains=10, turnstile_range=None, with_trains=True):
+        """Creates the line. station_data is the list of (station_id, station_name) of the stations
+        of the line in order (see network_data.py). turnstile_range is an optional (start, stop)
+        range of station indexes whose turnstiles are run by this line, which lets several processes
+        share a line. Without with_trains, the trains are not on the line until place_trains is
+        called"""
         self.color = color
         self.num_trains = num_trains
         self.stations = self._build_line_data(station_data)
+        self.turnstile_stations = self.stations
+        if turnstile_range is not None:
+            self.turnstile_stations = self.stations[turnstile_range[0]:turnstile_range[1]]
         # We must always discount the terminal station at the end of each direction
         self.num_stations = len(self.stations) - 1
+        self.trains = []
+        if with_trains:
+            self.place_trains()
+
+    def place_trains(self):
+        """Places the trains on the line, which emits their initial arrivals. The topics of the
+        stations have to be provisioned first (see Producer.provision_topics)"""
         self.trains = self._build_trains()
 
-    def _build_line_data(self, station_df):
+    def _build_line_data(self, station_data):
         """Constructs all stations on the line"""
-        stations = station_df["station_name"].unique()
-
-        station_data = station_df[station_df["station_name"] == stations[0]]
-        line = [
-            Station(station_data["station_id"].unique()[0], stations[0], self.color)
-        ]
+        station_id, station_name = station_data[0]
+        line = [Station(station_id, station_name, self.color)]
         prev_station = line[0]
-        for station in stations[1:]:
-            station_data = station_df[station_df["station_name"] == station]
+        for station_id, station_name in station_data[1:]:
             new_station = Station(
-                station_data["station_id"].unique()[0],
-                station,
+                station_id,
+                station_name,
                 self.color,
                 prev_station,
             )
@@ -46,25 +71,44 @@ class Line:
         return line
 
     def _build_trains(self):
-        """Constructs and assigns train objects to stations"""
+        """Constructs and assigns train objects to stations
+
+        Train positions are kept as offsets along the line's loop: offset i < num_stations is
+        station i in the b direction, and offset i >= num_stations is station
+        (2 * num_stations - i) in the a direction.
+        """
+        self.loop_length = self.num_stations * Line.num_directions
+        step_size = int(self.loop_length / self.num_trains) if self.num_trains > 0 else 0
+
+        if step_size > 0:
+            positions = np.arange(self.num_trains, dtype=np.int64) * step_size
+        else:
+            # More trains than positions, spread them evenly along the loop
+            positions = (np.arange(self.num_trains, dtype=np.int64) * self.loop_length) // max(self.num_trains, 1)
+        self.train_positions = positions
+
         trains = []
-        curr_loc = 0
-        b_dir = True
+        indexes, b_directions = self._station_indexes(positions)
         for train_id in range(self.num_trains):
             tid = str(train_id).zfill(3)
             train = Train(
-                f"{self.color.name[0].upper()}L{tid}", Train.status.in_service
+                f"{Line.train_prefixes[self.color.name]}{tid}", Train.status.in_service
             )
             trains.append(train)
 
-            if b_dir:
-                self.stations[curr_loc].arrive_b(train, None, None)
+            if b_directions[train_id]:
+                self.stations[indexes[train_id]].arrive_b(train, None, None)
             else:
-                self.stations[curr_loc].arrive_a(train, None, None)
-            curr_loc, b_dir = self._get_next_idx(curr_loc, b_dir)
+                self.stations[indexes[train_id]].arrive_a(train, None, None)
 
         return trains
 
+    def _station_indexes(self, positions):
+        """Converts loop offsets into station indexes and directions (True for b)"""
+        b_directions = positions < self.num_stations
+        indexes = np.where(b_directions, positions, self.loop_length - positions)
+        return indexes.tolist(), b_directions.tolist()
+
     def run(self, timestamp, time_step):
         """Advances trains between stations in the simulation. Runs turnstiles."""
         self._advance_turnstiles(timestamp, time_step)
@@ -76,113 +120,40 @@ class Line:
 
     def _advance_turnstiles(self, timestamp, time_step):
         """Advances the turnstiles in the simulation"""
-        _ = [station.turnstile.run(timestamp, time_step) for station in self.stations]
+        _ = [station.turnstile.run(timestamp, time_step) for station in self.turnstile_stations]
 
     def _advance_trains(self):
-        """Advances trains between stations in the simulation"""
-        # Find the first b train
-        curr_train, curr_index, b_direction = self._next_train()
-        self.stations[curr_index].b_train = None
+        """Advances trains between stations in the simulation
 
-        trains_advanced = 0
-        while trains_advanced < self.num_trains - 1:
-            # The train departs the current station
-            if b_direction is True:
-                self.stations[curr_index].b_train = None
-            else:
-                self.stations[curr_index].a_train = None
+        Every train moves one station along the loop. Trains are processed in loop order, starting
+        with the train closest to the first station in the b direction.
+        """
+        if self.num_trains == 0:
+            return
 
-            prev_station = self.stations[curr_index].station_id
-            prev_dir = "b" if b_direction else "a"
+        order = np.argsort(self.train_positions, kind="stable").tolist()
+        prev_indexes, prev_b_directions = self._station_indexes(self.train_positions)
+        self.train_positions = (self.train_positions + 1) % self.loop_length
+        indexes, b_directions = self._station_indexes(self.train_positions)
 
-            # Advance this train to the next station
-            curr_index, b_direction = self._get_next_idx(
-                curr_index, b_direction, step_size=1
-            )
-            if b_direction is True:
-                self.stations[curr_index].arrive_b(curr_train, prev_station, prev_dir)
-            else:
-                self.stations[curr_index].arrive_a(curr_train, prev_station, prev_dir)
+        for train_index in order:
+            train = self.trains[train_index]
 
-            # Find the next train to advance
-            move = 1 if b_direction else -1
-            next_train, curr_index, b_direction = self._next_train(
-                curr_index + move, b_direction
-            )
-            if b_direction is True:
-                curr_train = self.stations[curr_index].b_train
+            # The train departs the current station
+            prev_station = self.stations[prev_indexes[train_index]]
+            if prev_b_directions[train_index]:
+                prev_station.b_train = None
+                prev_dir = "b"
             else:
-                curr_train = self.stations[curr_index].a_train
-
-            curr_train = next_train
-            trains_advanced += 1
-
-        # The last train departs the current station
-        if b_direction is True:
-            self.stations[curr_index].b_train = None
-        else:
-            self.stations[curr_index].a_train = None
-
-        # Advance last train to the next station
-        prev_station = self.stations[curr_index].station_id
-        prev_dir = "b" if b_direction else "a"
-        curr_index, b_direction = self._get_next_idx(
-            curr_index, b_direction, step_size=1
-        )
-        if b_direction is True:
-            self.stations[curr_index].arrive_b(curr_train, prev_station, prev_dir)
-        else:
-            self.stations[curr_index].arrive_a(curr_train, prev_station, prev_dir)
-
-    def _next_train(self, start_index=0, b_direction=True, step_size=1):
-        """Given a starting index, finds the next train in either direction"""
-        if b_direction is True:
-            curr_index = self._next_train_b(start_index, step_size)
+                prev_station.a_train = None
+                prev_dir = "a"
 
-            if curr_index == -1:
-                curr_index = self._next_train_a(len(self.stations) - 1, step_size)
-                b_direction = False
-        else:
-            curr_index = self._next_train_a(start_index, step_size)
-
-            if curr_index == -1:
-                curr_index = self._next_train_b(0, step_size)
-                b_direction = True
-
-        if b_direction is True:
-            return self.stations[curr_index].b_train, curr_index, True
-        return self.stations[curr_index].a_train, curr_index, False
-
-    def _next_train_b(self, start_index, step_size):
-        """Finds the next train in the b direction, if any"""
-        for i in range(start_index, len(self.stations), step_size):
-            if self.stations[i].b_train is not None:
-                return i
-        return -1
-
-    def _next_train_a(self, start_index, step_size):
-        """Finds the next train in the a direction, if any"""
-        for i in range(start_index, 0, -step_size):
-            if self.stations[i].a_train is not None:
-                return i
-        return -1
-
-    def _get_next_idx(self, curr_index, b_direction, step_size=None):
-        """Calculates the next station index. Returns next index and if it is b direction"""
-        if step_size is None:
-            step_size = int((self.num_stations * Line.num_directions) / self.num_trains)
-        if b_direction is True:
-            next_index = curr_index + step_size
-            if next_index < self.num_stations:
-                return next_index, True
-            else:
-                return self.num_stations - (next_index % self.num_stations), False
-        else:
-            next_index = curr_index - step_size
-            if next_index > 0:
-                return next_index, False
+            # Advance this train to the next station
+            station = self.stations[indexes[train_index]]
+            if b_directions[train_index]:
+                station.arrive_b(train, prev_station.station_id, prev_dir)
             else:
-                return abs(next_index), True
+                station.arrive_a(train, prev_station.station_id, prev_dir)
 
     def __str__(self):
         return "\n".join(str(station) for station in self.stations)
@@ -0,0 +1,171 @@
+"""Loads the station topology and ridership tables the simulation is built from.
+
+The CSV files in data/ are parsed in a single pass and the result is cached as arrays in an .npz file
+named after the hash of the source files. Later starts only load the cache, and a change to any of
+the CSV files produces a new one.
+"""
+import csv
+import hashlib
+import logging
+import os
+import tempfile
+
+from os import environ
+from pathlib import Path
+from typing import Final, NamedTuple, Optional
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+# Directory with the CSV files of the network, producers/data unless pointed at a generated network
+# (see generate_network.py)
+DATA_DIR: Final[Path] = Path(environ.get("NETWORK_DATA_DIR") or Path(__file__).parents[1] / "data")
+
+# Directory the cache files are written to
+CACHE_DIR: Final[Path] = Path(environ.get("NETWORK_DATA_CACHE_DIR") or Path(__file__).parents[1] / "data" / "cache")
+
+# Bumped whenever the layout of the cache changes
+CACHE_VERSION: Final[int] = 1
+
+_SOURCE_FILES: Final[tuple[str, ...]] = ("cta_stations.csv", "ridership_seed.csv", "ridership_curve.csv")
+
+_DAY_TYPE_COLUMNS: Final[tuple[str, ...]] = ("avg_weekday_rides", "avg_saturday_rides", "avg_sunday-holiday_rides")
+
+
+class NetworkData(NamedTuple):
+    # Color name -> (station_id, station_name) of the stations of the line, in order
+    lines: dict[str, list[tuple[int, str]]]
+    # (stations,) ids of the stations with ridership data
+    ridership_station_ids: np.ndarray
+    # (stations, day types) average rides on weekdays, saturdays and sundays
+    ridership_rides: np.ndarray
+    # (hours,) ratio of the daily ridership that happens on each hour
+    ridership_ratios: np.ndarray
+
+
+_network_data: dict[Path, NetworkData] = {}
+
+
+def _source_hash(data_dir: Path) -> str:
+    digest = hashlib.sha256(str(CACHE_VERSION).encode("utf-8"))
+    for file_name in _SOURCE_FILES:
+        digest.update(file_name.encode("utf-8"))
+        digest.update((data_dir / file_name).read_bytes())
+    return digest.hexdigest()
+
+
+def _parse_lines(path: Path) -> dict[str, list[tuple[int, str]]]:
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.DictReader(csv_file)
+        # Every column after "order" flags whether the stop belongs to the line of that color
+        colors = reader.fieldnames[reader.fieldnames.index("order") + 1:]
+        rows = sorted(reader, key=lambda row: int(row["order"]))
+
+    lines = {}
+    for color in colors:
+        # A station has a row per direction, the first one gives its id
+        stations: dict[str, int] = {}
+        for row in rows:
+            if row[color].upper() == "TRUE" and row["station_name"] not in stations:
+                stations[row["station_name"]] = int(row["station_id"])
+        lines[color] = [(station_id, station_name) for station_name, station_id in stations.items()]
+    return lines
+
+
+def _parse_ridership(seed_path: Path, curve_path: Path) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    station_ids: dict[int, None] = {}
+    rides = []
+    with open(seed_path, newline="", encoding="utf-8") as csv_file:
+        for row in csv.DictReader(csv_file):
+            station_id = int(row["station_id"])
+            if station_id in station_ids:
+                continue
+            station_ids[station_id] = None
+            rides.append([float(row[column]) for column in _DAY_TYPE_COLUMNS])
+
+    with open(curve_path, newline="", encoding="utf-8") as csv_file:
+        curve = sorted((int(row["hour"]), float(row["ridership_ratio"])) for row in csv.DictReader(csv_file))
+
+    return (
+        np.array(list(station_ids), dtype=np.int64),
+        np.array(rides, dtype=np.float64).reshape(-1, len(_DAY_TYPE_COLUMNS)),
+        np.array([ratio for _, ratio in curve], dtype=np.float64)
+    )
+
+
+def _parse(data_dir: Path) -> NetworkData:
+    return NetworkData(
+        _parse_lines(data_dir / "cta_stations.csv"),
+        *_parse_ridership(data_dir / "ridership_seed.csv", data_dir / "ridership_curve.csv")
+    )
+
+
+def _write_cache(path: Path, network_data: NetworkData):
+    arrays = {
+        "colors": np.array(list(network_data.lines)),
+        "ridership_station_ids": network_data.ridership_station_ids,
+        "ridership_rides": network_data.ridership_rides,
+        "ridership_ratios": network_data.ridership_ratios
+    }
+    for color, stations in network_data.lines.items():
+        arrays[f"{color}_station_ids"] = np.array([station_id for station_id, _ in stations], dtype=np.int64)
+        arrays[f"{color}_station_names"] = np.array([station_name for _, station_name in stations], dtype=np.str_)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Written to a temporary file first so concurrent starts never read a partial cache
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as cache_file:
+            np.savez(cache_file, **arrays)
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.unlink(temporary_path)
+        raise
+
+
+def _read_cache(path: Path) -> NetworkData:
+    with np.load(path, allow_pickle=False) as arrays:
+        lines = {
+            color: list(zip(
+                arrays[f"{color}_station_ids"].tolist(),
+                arrays[f"{color}_station_names"].tolist()
+            ))
+            for color in arrays["colors"].tolist()
+        }
+        return NetworkData(
+            lines,
+            arrays["ridership_station_ids"],
+            arrays["ridership_rides"],
+            arrays["ridership_ratios"]
+        )
+
+
+def load_network_data(data_dir: Optional[Path] = None, cache_dir: Optional[Path] = None) -> NetworkData:
+    """Returns the network data of data_dir, from the cache when the source files did not change.
+    The result is kept for the lifetime of the process"""
+    data_dir = Path(data_dir or DATA_DIR).resolve()
+    network_data = _network_data.get(data_dir)
+    if network_data is not None:
+        return network_data
+
+    cache_path = (cache_dir or CACHE_DIR) / f"network-{_source_hash(data_dir)[:16]}.npz"
+    if cache_path.exists():
+        try:
+            network_data = _read_cache(cache_path)
+            logger.debug("Loaded network data from %s", cache_path)
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Ignoring unreadable network data cache %s: %s", cache_path, e)
+
+    if network_data is None:
+        network_data = _parse(data_dir)
+        try:
+            _write_cache(cache_path, network_data)
+            logger.info("Wrote network data cache %s", cache_path)
+        except OSError as e:
+            logger.warning("Unable to write network data cache %s: %s", cache_path, e)
+
+    _network_data[data_dir] = network_data
+    return network_data
@@ -0,0 +1,68 @@
+"""Chooses the partition of the station and turnstile events.
+
+The key of every event is {"timestamp": ...}, so when the partition is left to the producer, all the
+events of the same millisecond hash to the same partition. With the virtual clock, that is every
+event of a tick. The other strategies choose the partition explicitly from the value of the event.
+The key keeps its timestamp, so consumers are not affected:
+
+- "timestamp": the producer hashes the key
+- "station": crc32 of the station id, so the events of a station stay in order
+- "line": crc32 of the line name, so the events of a line stay in order
+- "round_robin": cycles through the partitions, the most even spread without any ordering
+"""
+import zlib
+
+from os import environ
+from typing import Any, Final, Optional, Sequence
+
+
+STRATEGIES: Final[tuple[str, ...]] = ("timestamp", "station", "line", "round_robin")
+
+# Strategy of the turnstile topic and of the per station arrival topics. The single arrivals topic
+# uses ARRIVALS_PARTITION_KEY (see Station)
+STRATEGY: Final[str] = environ.get("PARTITION_STRATEGY") or "timestamp"
+
+
+class Partitioner:
+    """Chooses the partition of the events of a topic"""
+
+    def __init__(self, strategy: str, num_partitions: int):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown partition strategy: {strategy}")
+        self.strategy = strategy
+        self.num_partitions = num_partitions
+        self._next_partition = 0
+
+    def partition(self, value: dict[str, Any]) -> Optional[int]:
+        """Returns the partition of an event, or None when the producer picks it from the key"""
+        if self.strategy == "station":
+            return zlib.crc32(str(value["station_id"]).encode("utf-8")) % self.num_partitions
+        elif self.strategy == "line":
+            return zlib.crc32(str(value["line"]).encode("utf-8")) % self.num_partitions
+        elif self.strategy == "round_robin":
+            partition = self._next_partition
+            self._next_partition = (partition + 1) % self.num_partitions
+            return partition
+        return None
+
+
+_partitioners: dict[str, Partitioner] = {}
+
+
+def get_partitioner(topic_name: str, strategy: str, num_partitions: int) -> Partitioner:
+    """Returns the partitioner of a topic. It is shared by every producer of the topic in the process,
+    so round robin cycles across all of them"""
+    partitioner = _partitioners.get(topic_name)
+    if partitioner is None or (partitioner.strategy, partitioner.num_partitions) != (strategy, num_partitions):
+        partitioner = Partitioner(strategy, num_partitions)
+        _partitioners[topic_name] = partitioner
+    return partitioner
+
+
+def skew(counts: Sequence[int]) -> float:
+    """Returns the messages of the busiest partition over the mean of all partitions: 1.0 is an even
+    spread, and len(counts) means every message went to a single partition"""
+    total = sum(counts)
+    if total == 0:
+        return 1.0
+    return max(counts) * len(counts) / total
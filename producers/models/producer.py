@@ -1,11 +1,13 @@
 """Producer base-class providing common utilites and functionality"""
 from os import environ
-from typing import Any, Final, Optional, TYPE_CHECKING
+from typing import Any, ClassVar, Final, Optional, TYPE_CHECKING
 
 import logging
 
+from confluent_kafka import KafkaError, KafkaException
 from confluent_kafka.admin import AdminClient, NewTopic
-from confluent_kafka.avro import AvroProducer, CachedSchemaRegistryClient
+
+from models.producer_registry import ProducerRegistry
 
 if TYPE_CHECKING:
     from avro.schema import RecordSchema
@@ -28,9 +30,19 @@ class Producer:
          "cleanup.policy": "delete"
     }
 
-    # Tracks existing topics across all Producer instances
+    # Tracks the topics registered across all Producer instances
     existing_topics: set[str] = set([])
 
+    # Topics registered by Producer instances that still have to be created by provision_topics
+    pending_topics: ClassVar[dict[str, NewTopic]] = {}
+
+    # Snapshot of the topic names in the cluster, fetched once and shared by every Producer
+    _cluster_topics: ClassVar[Optional[set[str]]] = None
+
+    # Broker properties used to provision the pending topics
+    _admin_properties: ClassVar[Optional[dict[str, Any]]] = None
+    _admin_client: ClassVar[Optional[AdminClient]] = None
+
     def __init__(
         self,
         topic_name: str,
@@ -61,61 +73,98 @@ class Producer:
             **(broker_properties or Producer.DEFAULT_BROKER_PROPERTIES),
         }
 
-        # If the topic does not already exist, try to create it
+        # Topics are not created here. They are collected and created in bulk by provision_topics
         if self.topic_name not in Producer.existing_topics:
-            self.create_topic()
+            self.register_topic()
             Producer.existing_topics.add(self.topic_name)
 
+        # Every Producer sends through the same process-wide sink, which keeps the key and value
+        # schemas of each topic
+        self.producer = None
         if create_producer:
-            self.producer = AvroProducer(
-                self.broker_properties,
-                schema_registry=CachedSchemaRegistryClient(self._schema_registry_url),
-                default_key_schema=self.key_schema,
-                default_value_schema=self.value_schema
-            )
-
-    def create_topic(self):
-        """Creates the producer topic if it does not already exist"""
-
-        logger.info("Creating topic '%s' if it does not exists", self.topic_name)
+            self.producer = ProducerRegistry.acquire(self.broker_properties, self._schema_registry_url)
+            self.producer.register_topic(self.topic_name, self.key_schema, self.value_schema, self.num_partitions)
+
+    def register_topic(self):
+        """Registers the producer topic so it is created by the next call to provision_topics"""
+        if ProducerRegistry.sink_type != "kafka":
+            return
+
+        logger.debug("Registering topic '%s'", self.topic_name)
+
+        Producer.pending_topics[self.topic_name] = NewTopic(
+            self.topic_name,
+            num_partitions=self.num_partitions,
+            replication_factor=self.num_replicas,
+            config={
+                **Producer.DEFAULT_TOPIC_CONFIG,
+                **self.topic_config
+            }
+        )
+        if Producer._admin_properties is None:
+            Producer._admin_properties = self.broker_properties
+
+    @classmethod
+    def admin_client(cls) -> AdminClient:
+        """Returns the AdminClient shared by every Producer"""
+        if cls._admin_client is None:
+            Producer._admin_client = AdminClient(Producer._admin_properties)
+
+        return cls._admin_client
+
+    @classmethod
+    def cluster_topics(cls, refresh: bool = False) -> set[str]:
+        """Returns the cached snapshot of the topic names in the cluster"""
+        if cls._cluster_topics is None or refresh:
+            Producer._cluster_topics = set(Producer.admin_client().list_topics(timeout=10).topics)
+
+        return cls._cluster_topics
+
+    @classmethod
+    def provision_topics(cls):
+        """Creates every registered topic missing from the cluster with a single create_topics call"""
+        if not cls.pending_topics:
+            return
 
         try:
-            admin_client = AdminClient(self.broker_properties)
-
-            if self.topic_name in admin_client.list_topics().topics:
-                logger.info("Topic '%s' already exists", self.topic_name)
-                return
-
-            logger.info("Attempting to create topic '%s'", self.topic_name)
-
-            topic_futures = admin_client.create_topics([
-                NewTopic(
-                    self.topic_name,
-                    num_partitions=self.num_partitions,
-                    replication_factor=self.num_replicas,
-                    config={
-                        **Producer.DEFAULT_TOPIC_CONFIG,
-                        **self.topic_config
-                    }
-                ),
-            ], operation_timeout=5.0)
-
-            # Since we're only creating one topic, we don't need to iterate over the create_topics
-            # futures dictionary.
-            future_result = topic_futures[self.topic_name].result()
-
-            logger.debug("topic_name: %s, future_result: %s", self.topic_name, future_result)
+            cluster_topics = cls.cluster_topics()
+            new_topics = [
+                new_topic for topic_name, new_topic in cls.pending_topics.items()
+                if topic_name not in cluster_topics
+            ]
+
+            logger.info(
+                "Provisioning topics. registered: %d, missing: %d",
+                len(cls.pending_topics), len(new_topics)
+            )
+
+            if new_topics:
+                topic_futures = cls.admin_client().create_topics(new_topics, operation_timeout=5.0)
+
+                for topic_name, topic_future in topic_futures.items():
+                    try:
+                        future_result = topic_future.result()
+                        logger.debug("topic_name: %s, future_result: %s", topic_name, future_result)
+                    except KafkaException as e:
+                        # Another process might have created the topic after the snapshot was taken
+                        if e.args[0].code() != KafkaError.TOPIC_ALREADY_EXISTS:
+                            raise e
+                        logger.info("Topic '%s' already exists", topic_name)
+                    cluster_topics.add(topic_name)
+
+            cls.pending_topics.clear()
         except Exception as e:
-            logger.exception("Exception raised while trying to create a topic. topic_name = %s", self.topic_name)
+            logger.exception("Exception raised while trying to provision topics. topic_names = %s", list(cls.pending_topics))
             raise e
 
     def close(self):
-        """Prepares the producer for exit by cleaning up the producer"""
-        
+        """Prepares the producer for exit by releasing the shared sink"""
+        if self.producer is None:
+            return
+
         try:
-            self.producer.purge()
-            self.producer.flush()
-            self.producer.close()
+            ProducerRegistry.release(self.producer)
+            self.producer = None
         except Exception as e:
             logger.exception("Exception raised while trying to close a produce. topic_name = %s", self.topic_name)
             raise e
@@ -0,0 +1,210 @@
+"""Process-wide registry of the sinks shared by every Producer instance"""
+import time
+
+from os import environ
+from threading import Lock
+from typing import Any, ClassVar, Final, Optional, TYPE_CHECKING
+
+import logging
+
+from confluent_kafka import Producer as KafkaProducer
+from confluent_kafka.avro import CachedSchemaRegistryClient
+
+from models.avro_codec import AvroCodec
+from models.sinks import AvroFileSink, DeliveryStats, NdjsonFileSink, NullSink, Sink
+
+if TYPE_CHECKING:
+    from confluent_kafka import KafkaError, Message
+
+
+logger = logging.getLogger(__name__)
+
+
+class SharedProducer(Sink):
+    """Kafka sink. Wraps a single Kafka producer and keeps the default key and value schemas of every
+    topic sent through it. Records are serialized with an AvroCodec. It also tracks the delivery
+    reports of every message, counting the messages delivered to each partition, and applies
+    backpressure when the local queue fills up"""
+
+    # Number of queued messages above which service blocks until the queue drains below the low
+    # water mark
+    QUEUE_HIGH_WATER_MARK: Final[int] = int(environ.get("PRODUCER_QUEUE_HIGH_WATER_MARK") or "80000")
+    QUEUE_LOW_WATER_MARK: Final[int] = int(environ.get("PRODUCER_QUEUE_LOW_WATER_MARK") or "40000")
+
+    # Seconds service blocks at most waiting for the queue to drain, so the clock and shutdown stay
+    # responsive when the brokers are unreachable
+    BACKPRESSURE_TIMEOUT: Final[float] = float(environ.get("PRODUCER_BACKPRESSURE_TIMEOUT") or "30")
+
+    # Seconds close waits for the queued messages to be delivered before dropping them
+    CLOSE_TIMEOUT: Final[float] = float(environ.get("PRODUCER_CLOSE_TIMEOUT") or "30")
+
+    def __init__(self, broker_properties: dict[str, Any], schema_registry_url: str):
+        super().__init__()
+        self.broker_properties = broker_properties
+        self.schema_registry_url = schema_registry_url
+        self.codec = AvroCodec(CachedSchemaRegistryClient(schema_registry_url))
+        self.producer = KafkaProducer({**broker_properties, "client.id": self.__class__.__name__})
+
+    def _on_delivery(self, error: Optional["KafkaError"], message: "Message"):
+        stats = self.stats[message.topic()]
+        if error is None:
+            stats.delivered += 1
+            stats.partitions[message.partition()] += 1
+        else:
+            stats.failed += 1
+            logger.error("Failed to deliver message to topic '%s': %s", message.topic(), error)
+
+    def produce(self, topic: str, key: Any = None, value: Any = None, **kwargs):
+        """Produces a message to the given topic using its default schemas unless they are
+        overridden with the key_schema/value_schema arguments. When the local queue is full, it
+        serves delivery reports until there is room for the message"""
+        key_schema, value_schema = self.topic_schemas[topic]
+        key_schema = kwargs.pop("key_schema", key_schema)
+        value_schema = kwargs.pop("value_schema", value_schema)
+
+        key = self.codec.encode(topic, key_schema, key, is_key=True)
+        value = self.codec.encode(topic, value_schema, value)
+
+        while True:
+            try:
+                self.producer.produce(
+                    topic=topic,
+                    key=key,
+                    value=value,
+                    on_delivery=self._on_delivery,
+                    **kwargs
+                )
+                break
+            except BufferError:
+                logger.debug("Local queue is full, waiting for deliveries. topic: %s", topic)
+                self.producer.poll(0.1)
+
+        self.stats[topic].produced += 1
+
+    def service(self) -> float:
+        """Serves the pending delivery reports. When the queue is above the high water mark, it blocks
+        until it drains below the low water mark, or for BACKPRESSURE_TIMEOUT seconds at most.
+        Returns the seconds spent blocked"""
+        self.producer.poll(0)
+
+        if len(self.producer) <= SharedProducer.QUEUE_HIGH_WATER_MARK:
+            return 0.0
+
+        start = time.monotonic()
+        logger.warning("Producer queue above the high water mark (%d messages), applying backpressure", len(self.producer))
+        deadline = start + SharedProducer.BACKPRESSURE_TIMEOUT
+        while len(self.producer) > SharedProducer.QUEUE_LOW_WATER_MARK:
+            if time.monotonic() >= deadline:
+                logger.error(
+                    "Producer queue still holds %d messages after %.1f seconds of backpressure, resuming",
+                    len(self.producer), SharedProducer.BACKPRESSURE_TIMEOUT
+                )
+                break
+            self.producer.poll(0.1)
+
+        return time.monotonic() - start
+
+    def poll(self, timeout: float = 0.0) -> int:
+        return self.producer.poll(timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> int:
+        return self.producer.flush() if timeout is None else self.producer.flush(timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """Waits up to timeout seconds for the queued messages to be delivered. Only the messages
+        still queued after that are dropped"""
+        timeout = SharedProducer.CLOSE_TIMEOUT if timeout is None else timeout
+
+        remaining = self.producer.flush(timeout)
+        if remaining > 0:
+            logger.error("Dropping %d messages that were not delivered in %.1f seconds", remaining, timeout)
+            self.producer.purge()
+            self.producer.flush(0)
+
+        super().close()
+
+    def __len__(self) -> int:
+        return len(self.producer)
+
+
+class ProducerRegistry:
+    """Hands out the sink shared by the whole process. It is a SharedProducer per (broker, schema
+    registry) pair, unless PRODUCER_SINK selects one of the file sinks"""
+
+    # Where the events of every Producer are sent: "kafka", "avro", "ndjson" or "null"
+    sink_type: ClassVar[str] = environ.get("PRODUCER_SINK") or "kafka"
+    # Directory the file sinks write to
+    sink_directory: ClassVar[str] = environ.get("PRODUCER_SINK_DIR") or "output"
+
+    _lock: ClassVar[Lock] = Lock()
+    _sinks: ClassVar[dict[tuple[str, str], Sink]] = {}
+    _references: ClassVar[dict[tuple[str, str], int]] = {}
+
+    @classmethod
+    def _create_sink(cls, broker_properties: dict[str, Any], schema_registry_url: str) -> Sink:
+        if cls.sink_type == "kafka":
+            return SharedProducer(broker_properties, schema_registry_url)
+        elif cls.sink_type == "avro":
+            return AvroFileSink(cls.sink_directory)
+        elif cls.sink_type == "ndjson":
+            return NdjsonFileSink(cls.sink_directory)
+        elif cls.sink_type == "null":
+            return NullSink()
+        raise ValueError(f"Unknown sink type: {cls.sink_type}")
+
+    @classmethod
+    def acquire(cls, broker_properties: dict[str, Any], schema_registry_url: str) -> Sink:
+        """Returns the shared sink, creating it if needed. Every call must be matched by a call to
+        release"""
+        if cls.sink_type == "kafka":
+            registry_key = (broker_properties["bootstrap.servers"], schema_registry_url)
+        else:
+            registry_key = (cls.sink_type, cls.sink_directory)
+
+        with cls._lock:
+            sink = cls._sinks.get(registry_key)
+
+            if sink is None:
+                logger.info("Creating shared sink for %s", registry_key)
+                sink = cls._create_sink(broker_properties, schema_registry_url)
+                sink.registry_key = registry_key
+                cls._sinks[registry_key] = sink
+                cls._references[registry_key] = 0
+
+            cls._references[registry_key] += 1
+
+        return sink
+
+    @classmethod
+    def release(cls, sink: Sink):
+        """Releases a reference to the shared sink. The last reference closes it"""
+        registry_key = sink.registry_key
+
+        with cls._lock:
+            cls._references[registry_key] -= 1
+
+            if cls._references[registry_key] > 0:
+                return
+
+            del cls._references[registry_key]
+            del cls._sinks[registry_key]
+
+        logger.info("Closing shared sink for %s", registry_key)
+        sink.close()
+
+    @classmethod
+    def service(cls) -> float:
+        """Serves the delivery reports of every shared sink, applying backpressure when needed.
+        Meant to be called once per simulation tick. Returns the seconds spent blocked"""
+        with cls._lock:
+            sinks = list(cls._sinks.values())
+
+        return sum(sink.service() for sink in sinks)
+
+    @classmethod
+    def stats(cls) -> dict[str, DeliveryStats]:
+        """Returns the delivery stats of every topic across the shared sinks"""
+        with cls._lock:
+            sinks = list(cls._sinks.values())
+
+        return {topic: stats for sink in sinks for topic, stats in sink.stats.items()}
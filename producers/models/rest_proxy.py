@@ -0,0 +1,129 @@
+"""Publishes records to Kafka through the REST proxy without blocking the simulation"""
+import logging
+import queue
+import threading
+import time
+
+from typing import Any, Final, Optional
+
+import requests
+
+from requests.adapters import HTTPAdapter
+
+
+logger = logging.getLogger(__name__)
+
+
+class RestProxyPublisher:
+    """Sends records to a topic through the REST proxy from a background thread. Records queued while
+    a request is in flight are sent together in the next request. Latency and errors are logged and
+    counted instead of raised"""
+
+    # Requests slower than this are logged as warnings
+    SLOW_REQUEST_SECONDS: Final[float] = 1.0
+
+    _STOP: Final[object] = object()
+
+    def __init__(
+        self,
+        rest_proxy_url: str,
+        topic_name: str,
+        key_schema: str,
+        value_schema: str,
+        headers: dict[str, str],
+        max_queue_size: int = 10000,
+        max_batch_size: int = 500,
+        request_timeout: float = 10.0
+    ):
+        self.url = f"{rest_proxy_url}/topics/{topic_name}"
+        self.topic_name = topic_name
+        self.key_schema = key_schema
+        self.value_schema = value_schema
+        self.max_batch_size = max_batch_size
+        self.request_timeout = request_timeout
+
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_latency: Optional[float] = None
+
+        # A single keep-alive connection is enough since requests are sent one at a time
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        self.session.mount(rest_proxy_url, HTTPAdapter(pool_connections=1, pool_maxsize=1))
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name=f"{self.__class__.__name__}-{topic_name}", daemon=True)
+        self._thread.start()
+
+    def publish(self, key: Any, value: Any):
+        """Queues a record to be sent. It never blocks; records are dropped if the queue is full"""
+        try:
+            self._queue.put_nowait({"key": key, "value": value})
+        except queue.Full:
+            self.dropped += 1
+            logger.error("REST proxy queue is full, dropping record. topic: %s, dropped: %d", self.topic_name, self.dropped)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            records = []
+            record = self._queue.get()
+
+            # Drain whatever else has been queued meanwhile into the same request
+            while True:
+                if record is RestProxyPublisher._STOP:
+                    stopping = True
+                    break
+                records.append(record)
+                if len(records) >= self.max_batch_size:
+                    break
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if records:
+                self._send(records)
+
+    def _send(self, records: list[dict]):
+        start = time.monotonic()
+        try:
+            response = self.session.post(
+                self.url,
+                json={
+                    "key_schema": self.key_schema,
+                    "value_schema": self.value_schema,
+                    "records": records
+                },
+                timeout=self.request_timeout
+            )
+            response.raise_for_status()
+            self.sent += len(records)
+        except requests.RequestException as e:
+            self.failed += len(records)
+            logger.error(
+                "Failed to send %d records to the REST proxy. topic: %s, failed: %d, error: %s",
+                len(records), self.topic_name, self.failed, e
+            )
+        finally:
+            self.last_latency = time.monotonic() - start
+
+        if self.last_latency > RestProxyPublisher.SLOW_REQUEST_SECONDS:
+            logger.warning("Slow REST proxy request. topic: %s, latency: %.3fs", self.topic_name, self.last_latency)
+        else:
+            logger.debug("Sent %d records to the REST proxy. topic: %s, latency: %.3fs", len(records), self.topic_name, self.last_latency)
+
+    def close(self, timeout: float = 30.0):
+        """Sends the queued records, waiting up to timeout seconds, and closes the session"""
+        try:
+            self._queue.put(RestProxyPublisher._STOP, timeout=timeout)
+        except queue.Full:
+            logger.error("Unable to stop the REST proxy publisher of topic %s", self.topic_name)
+        self._thread.join(timeout)
+        self.session.close()
+
+        logger.info(
+            "REST proxy publisher closed. topic: %s, sent: %d, failed: %d, dropped: %d",
+            self.topic_name, self.sent, self.failed, self.dropped
+        )
@@ -0,0 +1,220 @@
+"""Destinations for the events produced by the simulation.
+
+Every Producer sends its events to a Sink. The Kafka sink (SharedProducer, in producer_registry.py)
+is the default. The file sinks write events to disk, rotated per topic, which allows generating load
+and profiling the simulator without the Kafka stack running.
+"""
+import abc
+import json
+import logging
+import multiprocessing
+
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Final, Optional, TYPE_CHECKING
+
+import avro.datafile
+import avro.io
+import avro.schema
+
+from models.partitioning import skew
+if TYPE_CHECKING:
+    from avro.schema import RecordSchema
+
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryStats:
+    """Counts the delivered, failed and in-flight messages of a topic, and the delivered messages
+    of each partition"""
+
+    def __init__(self):
+        self.produced = 0
+        self.delivered = 0
+        self.failed = 0
+        # Set when the topic is registered with the number of partitions it is created with
+        self.num_partitions: Optional[int] = None
+        self.partitions: Counter[int] = Counter()
+
+    @property
+    def in_flight(self) -> int:
+        return self.produced - self.delivered - self.failed
+
+    def partition_counts(self) -> list[int]:
+        """Returns the delivered messages of every partition, including the empty ones"""
+        num_partitions = max(self.num_partitions or 0, max(self.partitions, default=-1) + 1)
+        return [self.partitions[partition] for partition in range(num_partitions)]
+
+    def __str__(self) -> str:
+        description = f"delivered: {self.delivered}, failed: {self.failed}, in flight: {self.in_flight}"
+        if self.partitions:
+            counts = self.partition_counts()
+            description += f", partitions: {counts}, skew: {skew(counts):.2f}"
+        return description
+
+
+class Sink(abc.ABC):
+    """Base class of the event destinations shared by every Producer of a process"""
+
+    def __init__(self):
+        # Set by the ProducerRegistry that hands out the sink
+        self.registry_key: Optional[tuple[str, str]] = None
+        self.topic_schemas: dict[str, tuple["RecordSchema", "RecordSchema"]] = {}
+        self.stats: defaultdict[str, DeliveryStats] = defaultdict(DeliveryStats)
+
+    def register_topic(
+        self,
+        topic_name: str,
+        key_schema: "RecordSchema",
+        value_schema: "RecordSchema",
+        num_partitions: Optional[int] = None
+    ):
+        """Sets the default key and value schemas used when producing to the given topic"""
+        if num_partitions is not None:
+            self.stats[topic_name].num_partitions = num_partitions
+
+        current_schemas = self.topic_schemas.get(topic_name)
+
+        if current_schemas is not None and current_schemas != (key_schema, value_schema):
+            logger.warning("Replacing the default schemas of topic '%s'", topic_name)
+
+        self.topic_schemas[topic_name] = (key_schema, value_schema)
+
+    @abc.abstractmethod
+    def produce(self, topic: str, key: Any = None, value: Any = None, **kwargs):
+        """Sends an event to the given topic. The key_schema/value_schema arguments override the
+        default schemas of the topic"""
+
+    def service(self) -> float:
+        """Called once per simulation tick. Returns the seconds spent blocked applying backpressure"""
+        return 0.0
+
+    def close(self):
+        """Flushes and releases the resources of the sink"""
+        for topic, stats in sorted(self.stats.items()):
+            logger.info("topic: %s, %s", topic, stats)
+
+
+class NullSink(Sink):
+    """Counts and discards every event, to measure the simulation without any I/O"""
+
+    def produce(self, topic: str, key: Any = None, value: Any = None, **kwargs):
+        stats = self.stats[topic]
+        stats.produced += 1
+        stats.delivered += 1
+        # Only the partitions chosen explicitly are known without a broker
+        partition = kwargs.get("partition")
+        if partition is not None:
+            stats.partitions[partition] += 1
+
+
+class FileSink(Sink):
+    """Writes the events of each topic to files under <directory>/<topic>/, starting a new file every
+    max_records_per_file events or when the schemas of the topic change. Files written by the
+    simulation workers carry the name of the worker, so each process writes its own series"""
+
+    extension: str = ""
+
+    # Default number of events written to a file before starting a new one
+    MAX_RECORDS_PER_FILE: Final[int] = 1000000
+
+    def __init__(self, directory: str, max_records_per_file: Optional[int] = None):
+        super().__init__()
+        self.directory = Path(directory)
+        self.max_records_per_file = max_records_per_file or FileSink.MAX_RECORDS_PER_FILE
+        self._files: dict[str, Any] = {}
+        self._file_schemas: dict[str, tuple["RecordSchema", "RecordSchema"]] = {}
+        self._file_records: defaultdict[str, int] = defaultdict(int)
+        self._file_indexes: dict[str, int] = {}
+
+        process_name = multiprocessing.current_process().name
+        self.series = "" if process_name == "MainProcess" else f"-{process_name}"
+
+    @abc.abstractmethod
+    def _open(self, path: Path, topic: str, key_schema: "RecordSchema", value_schema: "RecordSchema"):
+        """Opens a new file of the topic at the given path and returns it"""
+
+    @abc.abstractmethod
+    def _write(self, file: Any, topic: str, key: Any, value: Any):
+        """Writes an event to a file returned by _open"""
+
+    def _rotate(self, topic: str, schemas: tuple["RecordSchema", "RecordSchema"]):
+        topic_directory = self.directory / topic
+        topic_directory.mkdir(parents=True, exist_ok=True)
+
+        current_file = self._files.pop(topic, None)
+        if current_file is not None:
+            current_file.close()
+            self._file_indexes[topic] += 1
+        elif topic not in self._file_indexes:
+            # Continue after the files written by previous runs
+            self._file_indexes[topic] = len(list(topic_directory.glob(f"{topic}{self.series}-[0-9]*.{self.extension}")))
+        path = topic_directory / f"{topic}{self.series}-{self._file_indexes[topic]:05d}.{self.extension}"
+
+        logger.debug("Writing topic '%s' to %s", topic, path)
+        self._files[topic] = self._open(path, topic, *schemas)
+        self._file_schemas[topic] = schemas
+        self._file_records[topic] = 0
+
+    def produce(self, topic: str, key: Any = None, value: Any = None, **kwargs):
+        key_schema, value_schema = self.topic_schemas[topic]
+        schemas = (kwargs.get("key_schema", key_schema), kwargs.get("value_schema", value_schema))
+
+        if (
+            topic not in self._files or
+            self._file_schemas[topic] != schemas or
+            self._file_records[topic] >= self.max_records_per_file
+        ):
+            self._rotate(topic, schemas)
+
+        self._write(self._files[topic], topic, key, value)
+        self._file_records[topic] += 1
+
+        stats = self.stats[topic]
+        stats.produced += 1
+        stats.delivered += 1
+        partition = kwargs.get("partition")
+        if partition is not None:
+            stats.partitions[partition] += 1
+
+    def close(self):
+        for current_file in self._files.values():
+            current_file.close()
+        self._files.clear()
+        super().close()
+
+
+class NdjsonFileSink(FileSink):
+    """Writes every event as a {"topic", "key", "value"} JSON object per line"""
+
+    extension = "ndjson"
+
+    def _open(self, path: Path, topic: str, key_schema: "RecordSchema", value_schema: "RecordSchema"):
+        return open(path, "w", encoding="utf-8")
+
+    def _write(self, file: Any, topic: str, key: Any, value: Any):
+        file.write(json.dumps({"topic": topic, "key": key, "value": value}))
+        file.write("\n")
+
+
+class AvroFileSink(FileSink):
+    """Writes events to Avro object container files whose records hold the topic, key and value"""
+
+    extension = "avro"
+
+    def _open(self, path: Path, topic: str, key_schema: "RecordSchema", value_schema: "RecordSchema"):
+        envelope_schema = avro.schema.parse(json.dumps({
+            "namespace": "com.udacity",
+            "type": "record",
+            "name": "event",
+            "fields": [
+                {"name": "topic", "type": "string"},
+                {"name": "key", "type": key_schema.to_json()},
+                {"name": "value", "type": value_schema.to_json()}
+            ]
+        }))
+        return avro.datafile.DataFileWriter(open(path, "wb"), avro.io.DatumWriter(), envelope_schema, codec="deflate")
+
+    def _write(self, file: Any, topic: str, key: Any, value: Any):
+        file.append({"topic": topic, "key": key, "value": value})
@@ -1,13 +1,14 @@
 """Methods pertaining to loading and configuring CTA "L" station data."""
 import logging
 
+from os import environ
 from pathlib import Path
 from typing import ClassVar, Optional, TYPE_CHECKING
-from this import d
 
 from confluent_kafka import avro
 
 from models import Turnstile
+from models import partitioning
 from models.common import get_topic_safe_station_name, time_millis
 from models.producer import Producer
 
@@ -25,6 +26,16 @@ class Station(Producer):
     key_schema: ClassVar["RecordSchema"] = avro.load(f"{Path(__file__).parents[0]}/schemas/arrival_key.json")
     value_schema: ClassVar["RecordSchema"] = avro.load(f"{Path(__file__).parents[0]}/schemas/arrival_value.json")
 
+    # "per_station" sends the arrivals of each station to its own topic. "single" sends every arrival
+    # to arrivals_topic_name, partitioned by station or line, so the number of topics and partitions
+    # does not grow with the network
+    topology: ClassVar[str] = environ.get("ARRIVALS_TOPOLOGY") or "per_station"
+    arrivals_topic_name: ClassVar[str] = "com.udacity.nd029.p1.v1.arrivals"
+    # Partitions of the single arrivals topic, and the partition strategy of it (see
+    # models/partitioning.py)
+    arrivals_partitions: ClassVar[int] = int(environ.get("ARRIVALS_PARTITIONS") or "10")
+    partition_key: ClassVar[str] = environ.get("ARRIVALS_PARTITION_KEY") or "station"
+
     def __init__(self,
         station_id: str,
         name: str,
@@ -33,19 +44,30 @@ class Station(Producer):
         direction_b: Optional["Station"] = None
     ):
         self.name = name
-        station_name = get_topic_safe_station_name(name)
+        self.station_id = int(station_id)
+        self.color = color
+
+        if Station.topology == "single":
+            topic_name = Station.arrivals_topic_name
+            num_partitions = Station.arrivals_partitions
+            partition_strategy = Station.partition_key
+        elif Station.topology == "per_station":
+            topic_name = f"com.udacity.nd029.p1.v1.arrival.{get_topic_safe_station_name(name)}"
+            num_partitions = 10
+            partition_strategy = partitioning.STRATEGY
+        else:
+            raise ValueError(f"Unknown arrivals topology: {Station.topology}")
 
-        topic_name = f"com.udacity.nd029.p1.v1.arrival.{station_name}"
         super().__init__(
             topic_name,
             key_schema=Station.key_schema,
             value_schema=Station.value_schema,
-            num_partitions=10,
+            num_partitions=num_partitions,
             num_replicas=1
         )
 
-        self.station_id = int(station_id)
-        self.color = color
+        self.partitioner = partitioning.get_partitioner(topic_name, partition_strategy, num_partitions)
+
         self.dir_a = direction_a
         self.dir_b = direction_b
         self.a_train = None
@@ -59,18 +81,22 @@ class Station(Producer):
         prev_direction: str
     ):
         """Simulates train arrivals at this station"""
+        value = {
+            "station_id": self.station_id,
+            "train_id": train.train_id,
+            "direction": direction,
+            "line": self.color.name,
+            "train_status": train.status.name,
+            "prev_station_id": prev_station_id,
+            "prev_direction": prev_direction
+        }
+        partition = self.partitioner.partition(value)
+        partition_kwargs = {} if partition is None else {"partition": partition}
         self.producer.produce(
             topic=self.topic_name,
             key={"timestamp": time_millis()},
-            value={
-                "station_id": self.station_id,
-                "train_id": train.train_id,
-                "direction": direction,
-                "line": self.color.name,
-                "train_status": train.status.name,
-                "prev_station_id": prev_station_id,
-                "prev_direction": prev_direction
-            }
+            value=value,
+            **partition_kwargs
         )
 
     def __str__(self) -> str:
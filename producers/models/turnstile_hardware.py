@@ -1,66 +1,139 @@
 import logging
-import math
-from pathlib import Path
-import random
+from datetime import datetime, timedelta, timezone
+from enum import IntEnum
+from os import environ
+from typing import ClassVar, Optional
 
-import pandas as pd
+import numpy as np
 
-from models.producer import Producer
+from models.network_data import NetworkData, load_network_data
 
 
 logger = logging.getLogger(__name__)
 
 
+class RidershipModel:
+    """Precomputed ridership of every station as a station x day type x hour matrix, used to
+    calculate the turnstile entries of all the stations with a single vectorized call per tick"""
+
+    day_types = IntEnum("day_types", "weekday saturday sunday", start=0)
+
+    # Bounds of the random variation added to the number of entries of each station
+    JITTER_LOW: ClassVar[int] = -5
+    JITTER_HIGH: ClassVar[int] = 5
+
+    def __init__(
+        self,
+        station_ids: np.ndarray,
+        rides: np.ndarray,
+        ratios: np.ndarray,
+        interpolate: bool = False,
+        seed: Optional[int] = None
+    ):
+        """station_ids are the (stations,) ids, rides the (stations, day types) average rides in the
+        same order as RidershipModel.day_types, and ratios the (hours,) ratio of the daily ridership
+        that happens on each hour"""
+        self.interpolate = interpolate
+        self.seed = seed
+
+        self.station_index: dict[int, int] = {
+            station_id: index for index, station_id in enumerate(station_ids.tolist())
+        }
+
+        riders = np.rint(rides)
+        self.matrix: np.ndarray = riders[:, :, np.newaxis] * ratios[np.newaxis, np.newaxis, :]
+
+        self._rng = np.random.default_rng()
+        self._entries_key: Optional[tuple[datetime, timedelta]] = None
+        self._entries: Optional[np.ndarray] = None
+
+    @classmethod
+    def day_type(cls, timestamp: datetime) -> int:
+        dow = timestamp.weekday()
+        if dow < 5:
+            return cls.day_types.weekday
+        elif dow == 5:
+            return cls.day_types.saturday
+        return cls.day_types.sunday
+
+    def hourly_ridership(self, timestamp: datetime) -> np.ndarray:
+        """Returns the ridership of every station for the hour of the timestamp. When interpolation is
+        enabled, it blends the current and the next hour according to the minutes elapsed"""
+        hour_ridership = self.matrix[:, self.day_type(timestamp), timestamp.hour]
+
+        if not self.interpolate:
+            return hour_ridership
+
+        next_timestamp = timestamp.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        next_hour_ridership = self.matrix[:, self.day_type(next_timestamp), next_timestamp.hour]
+        weight = (timestamp.minute * 60 + timestamp.second) / 3600.0
+
+        return hour_ridership + (next_hour_ridership - hour_ridership) * weight
+
+    def _tick_rng(self, timestamp: datetime) -> np.random.Generator:
+        """Returns the generator for the jitter of the given tick. With a seed, the jitter of each
+        station only depends on the seed, the station row and the simulated time, so it does not
+        matter which process or in which order the ticks are computed"""
+        if self.seed is None:
+            return self._rng
+        tick_seconds = int(timestamp.replace(tzinfo=timezone.utc).timestamp())
+        return np.random.default_rng([self.seed, tick_seconds])
+
+    def entries(self, timestamp: datetime, time_step: timedelta) -> np.ndarray:
+        """Returns the number of turnstile entries of every station for the given timeframe. The
+        result is computed once per (timestamp, time_step) and shared by every turnstile"""
+        if self._entries_key != (timestamp, time_step):
+            total_steps = int(60 / (60 / time_step.total_seconds()))
+
+            # Calculate approximation of number of entries for this simulation step
+            entries = np.floor(self.hourly_ridership(timestamp) / total_steps).astype(np.int64)
+            # Introduce some randomness in the data
+            entries += self._tick_rng(timestamp).integers(
+                RidershipModel.JITTER_LOW, RidershipModel.JITTER_HIGH, size=entries.shape[0]
+            )
+
+            self._entries = np.maximum(entries, 0)
+            self._entries_key = (timestamp, time_step)
+
+        return self._entries
+
+
 class TurnstileHardware:
-    curve_df = None
-    seed_df = None
+    model: ClassVar[Optional[RidershipModel]] = None
+
+    # Blend the ridership of consecutive hours instead of stepping on the hour
+    interpolate: ClassVar[bool] = (environ.get("RIDERSHIP_INTERPOLATE") or "false").lower() in ("1", "true", "yes")
 
     def __init__(self, station):
         """Create the Turnstile"""
         self.station = station
         TurnstileHardware._load_data()
-        self.metrics_df = TurnstileHardware.seed_df[
-            TurnstileHardware.seed_df["station_id"] == station.station_id
-        ]
-        self.weekday_ridership = int(
-            round(self.metrics_df.iloc[0]["avg_weekday_rides"])
-        )
-        self.saturday_ridership = int(
-            round(self.metrics_df.iloc[0]["avg_saturday_rides"])
-        )
-        self.sunday_ridership = int(
-            round(self.metrics_df.iloc[0]["avg_sunday-holiday_rides"])
-        )
+        self.index = TurnstileHardware.model.station_index[station.station_id]
 
     @classmethod
     def _load_data(cls):
-        if cls.curve_df is None:
-            cls.curve_df = pd.read_csv(
-                f"{Path(__file__).parents[1]}/data/ridership_curve.csv"
-            )
-        if cls.seed_df is None:
-            cls.seed_df = pd.read_csv(
-                f"{Path(__file__).parents[1]}/data/ridership_seed.csv"
-            )
+        if cls.model is None:
+            cls.use_network(load_network_data())
+
+    @classmethod
+    def use_network(cls, network_data: NetworkData):
+        """Sets the ridership of the network being simulated"""
+        seed = cls.model.seed if cls.model is not None else None
+        cls.model = RidershipModel(
+            network_data.ridership_station_ids,
+            network_data.ridership_rides,
+            network_data.ridership_ratios,
+            interpolate=cls.interpolate,
+            seed=seed
+        )
+
+    @classmethod
+    def set_seed(cls, seed: Optional[int]):
+        """Makes the ridership jitter of every station deterministic for the given seed"""
+        cls._load_data()
+        cls.model.seed = seed
+        cls.model._entries_key = None
 
     def get_entries(self, timestamp, time_step):
         """Returns the number of turnstile entries for the given timeframe"""
-        hour_curve = TurnstileHardware.curve_df[
-            TurnstileHardware.curve_df["hour"] == timestamp.hour
-        ]
-        ratio = hour_curve.iloc[0]["ridership_ratio"]
-        total_steps = int(60 / (60 / time_step.total_seconds()))
-
-        num_riders = 0
-        dow = timestamp.weekday()
-        if dow >= 0 or dow < 5:
-            num_riders = self.weekday_ridership
-        elif dow == 6:
-            num_riders = self.saturday_ridership
-        else:
-            num_riders = self.sunday_ridership
-
-        # Calculate approximation of number of entries for this simulation step
-        num_entries = int(math.floor(num_riders * ratio / total_steps))
-        # Introduce some randomness in the data
-        return max(num_entries + random.choice(range(-5, 5)), 0)
+        return int(TurnstileHardware.model.entries(timestamp, time_step)[self.index])
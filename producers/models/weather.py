@@ -1,20 +1,22 @@
 """Methods pertaining to weather data"""
 import json
 import logging
-import random
 import urllib.parse
 
 from os import environ
 from enum import IntEnum
 from pathlib import Path
-from typing import Any, ClassVar, Final
-
-import requests
+from typing import Any, ClassVar, Final, Optional, TYPE_CHECKING
 
 from confluent_kafka import avro
 
-from models.common import time_millis
+from models.common import make_rng, time_millis
 from models.producer import Producer
+from models.producer_registry import ProducerRegistry
+from models.rest_proxy import RestProxyPublisher
+
+if TYPE_CHECKING:
+    from avro.schema import RecordSchema
 
 
 logger = logging.getLogger(__name__)
@@ -31,13 +33,13 @@ class Weather(Producer):
 
     rest_proxy_url: ClassVar[str] = environ.get("REST_PROXY_URL") or "http://localhost:8082"
 
+    # Parsed schemas, used when the events go to a sink other than Kafka
+    key_record_schema: ClassVar["RecordSchema"] = avro.load(f"{Path(__file__).parents[0]}/schemas/weather_key.json")
+    value_record_schema: ClassVar["RecordSchema"] = avro.load(f"{Path(__file__).parents[0]}/schemas/weather_value.json")
+
     # We're doing a load/dumps combination to validate the schemas
-    key_schema: ClassVar[str] = json.dumps(
-        avro.load(f"{Path(__file__).parents[0]}/schemas/weather_key.json").to_json()
-    )
-    value_schema: ClassVar[str] = json.dumps(
-        avro.load(f"{Path(__file__).parents[0]}/schemas/weather_value.json").to_json()
-    )
+    key_schema: ClassVar[str] = json.dumps(key_record_schema.to_json())
+    value_schema: ClassVar[str] = json.dumps(value_record_schema.to_json())
 
     _WINTER_MONTHS: Final[set[str]] = set((0, 1, 2, 3, 10, 11))
     _SUMMER_MONTHS: Final[set[str]] = set((6, 7, 8))
@@ -46,17 +48,30 @@ class Weather(Producer):
         "Content-Type": "application/vnd.kafka.avro.v2+json"
     }
 
-    def __init__(self, month):
-        # We don't set the schemas since we're going to use REST proxy
+    def __init__(self, month, seed: Optional[int] = None):
+        # Kafka events go through the REST proxy, so the producer is only needed by the other sinks
+        use_rest_proxy = ProducerRegistry.sink_type == "kafka"
         super().__init__(
             Weather.topic_name,
-            key_schema=None,
-            value_schema=None,
+            key_schema=Weather.key_record_schema,
+            value_schema=Weather.value_record_schema,
             num_partitions=4,
             num_replicas=1,
-            create_producer=False
+            create_producer=not use_rest_proxy
         )
 
+        # Records are sent from a background thread so a slow REST proxy does not stall the simulation
+        self.publisher = None
+        if use_rest_proxy:
+            self.publisher = RestProxyPublisher(
+                Weather.rest_proxy_url,
+                Weather.topic_name,
+                Weather.key_schema,
+                Weather.value_schema,
+                Weather._headers
+            )
+
+        self.rng = make_rng(seed, "weather")
         self.status = Weather.status.sunny
         self.temp = 70.0
         
@@ -74,34 +89,31 @@ class Weather(Producer):
         elif month in Weather._SUMMER_MONTHS:
             mode = 1.0
         
-        self.temp += min(max(-20.0, random.triangular(-10.0, 10.0, mode)), 100.0)
-        self.status = random.choice(list(Weather.status))
+        self.temp += min(max(-20.0, self.rng.triangular(-10.0, 10.0, mode)), 100.0)
+        self.status = self.rng.choice(list(Weather.status))
 
     def run(self, month):
         self._set_weather(month)
 
-        response = requests.post(
-            f"{Weather.rest_proxy_url}/topics/{Weather.topic_name}",
-            headers=Weather._headers,
-            json={
-                "key_schema": Weather.key_schema,
-                "value_schema": Weather.value_schema,
-                "records": [
-                    {
-                        "key": {"timestamp": time_millis()},
-                        "value": {
-                            "temperature": self.temp,
-                            "status": self.status.name  # Sending the label instead of the enum valuue
-                        },
-                    }
-                ]
-            }
-        )
+        key = {"timestamp": time_millis()}
+        value = {
+            "temperature": self.temp,
+            "status": self.status.name  # Sending the label instead of the enum valuue
+        }
 
-        response.raise_for_status()
+        if self.publisher is not None:
+            self.publisher.publish(key, value)
+        else:
+            self.producer.produce(topic=Weather.topic_name, key=key, value=value)
 
         logger.debug(
-            "sent weather data to kafka, temp: %s, status: %s",
+            "queued weather data for kafka, temp: %s, status: %s",
             self.temp,
             self.status.name,
         )
+
+    def close(self):
+        """Sends the pending weather records and stops the publisher"""
+        if self.publisher is not None:
+            self.publisher.close()
+        super().close()
@@ -0,0 +1,62 @@
+"""Reports how the messages of the simulation topics are spread across their partitions.
+
+The messages of each partition are read from its low and high watermark offsets, so the report covers
+everything in the topic, whoever produced it. Every topic is printed as a JSON line with its
+partition counts and skew: the messages of the busiest partition over the mean, 1.0 being an even
+spread (see models/partitioning.py). Run from the producers directory while the Kafka stack is up:
+
+    python partition_report.py
+    python partition_report.py --topic com.udacity.nd029.p1.v1.turnstile
+"""
+import argparse
+import json
+
+from os import environ
+
+from confluent_kafka import Consumer, TopicPartition
+from confluent_kafka.admin import AdminClient
+
+from models.partitioning import skew
+
+
+TOPIC_PREFIX = "com.udacity.nd029.p1.v1."
+
+
+def partition_report(broker_url: str, topics: list[str]) -> list[dict]:
+    """Returns the messages of every partition of the given topics, or of every simulation topic when
+    none is given"""
+    metadata = AdminClient({"bootstrap.servers": broker_url}).list_topics(timeout=10)
+    topic_names = topics or sorted(topic for topic in metadata.topics if topic.startswith(TOPIC_PREFIX))
+
+    # Watermarks are read without joining a group or committing offsets
+    consumer = Consumer({"bootstrap.servers": broker_url, "group.id": "partition-report", "enable.auto.commit": False})
+    try:
+        report = []
+        for topic in topic_names:
+            topic_metadata = metadata.topics.get(topic)
+            if topic_metadata is None:
+                raise ValueError(f"Unknown topic: {topic}")
+
+            counts = []
+            for partition in sorted(topic_metadata.partitions):
+                low, high = consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=10)
+                counts.append(high - low)
+
+            report.append({"topic": topic, "messages": sum(counts), "partitions": counts, "skew": skew(counts)})
+        return report
+    finally:
+        consumer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "--topic",
+        action="append",
+        dest="topics",
+        help=f"Only report the given topic, instead of every topic starting with {TOPIC_PREFIX}. Can be repeated"
+    )
+    args = parser.parse_args()
+
+    for topic_report in partition_report(environ.get("BROKER_URL") or "plaintext://localhost:9092", args.topics):
+        print(json.dumps(topic_report))
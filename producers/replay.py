@@ -0,0 +1,252 @@
+"""Replays the events recorded by the file sinks (see models/sinks.py) into Kafka.
+
+The events of every topic are merged by the timestamp of their keys and produced keeping their
+relative timing, scaled by the requested speed. Produce calls are asynchronous: the shared producer
+batches them and delivery reports are served while waiting for the next event, so at full speed the
+replay rate is bound by the broker.
+"""
+import argparse
+import heapq
+import json
+import logging
+import logging.config
+import math
+import time
+from os import environ
+from pathlib import Path
+from typing import Any, Final, Iterator, NamedTuple, Optional, TYPE_CHECKING
+
+import avro.datafile
+import avro.io
+
+# Import logging before models to ensure configuration is picked up
+logging.config.fileConfig(f"{Path(__file__).parents[0]}/logging.ini")
+
+from models import Station, Turnstile, Weather, partitioning
+from models.producer import Producer
+from models.producer_registry import ProducerRegistry
+
+if TYPE_CHECKING:
+    from avro.schema import RecordSchema
+
+
+logger = logging.getLogger(__name__)
+
+
+# Events produced between calls to ProducerRegistry.service, which applies backpressure
+SERVICE_INTERVAL: Final[int] = 1000
+
+# Replayed events are batched for longer than the simulation ones, throughput matters more here
+REPLAY_BROKER_PROPERTIES: Final[dict[str, Any]] = {
+    **Producer.DEFAULT_BROKER_PROPERTIES,
+    "linger.ms": 50,
+    "batch.num.messages": 10000
+}
+
+
+class RecordedEvent(NamedTuple):
+    timestamp: int
+    topic: str
+    key: dict
+    value: dict
+    key_schema: "RecordSchema"
+    value_schema: "RecordSchema"
+
+
+def topic_settings(topic: str, value: dict) -> tuple["RecordSchema", "RecordSchema", int]:
+    """Returns the key schema, value schema and number of partitions the models use for the topic"""
+    if topic.startswith("com.udacity.nd029.p1.v1.arrival."):
+        return Station.key_schema, Station.value_schema, 10
+    if topic == Station.arrivals_topic_name:
+        return Station.key_schema, Station.value_schema, Station.arrivals_partitions
+    if topic == "com.udacity.nd029.p1.v1.turnstile":
+        value_schema = Turnstile.aggregated_value_schema if "entries" in value else Turnstile.value_schema
+        return Turnstile.key_schema, value_schema, 10
+    if topic == Weather.topic_name:
+        return Weather.key_record_schema, Weather.value_record_schema, 4
+    raise ValueError(f"Unknown topic: {topic}")
+
+
+def partition_strategy(topic: str) -> str:
+    """Returns the partition strategy the models use for the topic"""
+    if topic == Station.arrivals_topic_name:
+        return Station.partition_key
+    if topic == Weather.topic_name:
+        return "timestamp"
+    return partitioning.STRATEGY
+
+
+def _read_ndjson(path: Path) -> Iterator[RecordedEvent]:
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            key_schema, value_schema, _ = topic_settings(event["topic"], event["value"])
+            yield RecordedEvent(
+                event["key"]["timestamp"], event["topic"], event["key"], event["value"], key_schema, value_schema
+            )
+
+
+def _read_avro(path: Path) -> Iterator[RecordedEvent]:
+    with avro.datafile.DataFileReader(open(path, "rb"), avro.io.DatumReader()) as reader:
+        # The envelope records of the file carry the schemas the events were written with
+        fields = reader.datum_reader.writers_schema.fields_dict
+        key_schema, value_schema = fields["key"].type, fields["value"].type
+        for event in reader:
+            yield RecordedEvent(
+                event["key"]["timestamp"], event["topic"], event["key"], event["value"], key_schema, value_schema
+            )
+
+
+def _read_series(paths: list[Path]) -> Iterator[RecordedEvent]:
+    for path in paths:
+        if path.suffix == ".ndjson":
+            yield from _read_ndjson(path)
+        elif path.suffix == ".avro":
+            yield from _read_avro(path)
+
+
+def read_topic(topic_directory: Path) -> Iterator[RecordedEvent]:
+    """Yields the recorded events of a topic ordered by timestamp. Each process that wrote the topic
+    left its own series of files, which are read file after file and merged with the others"""
+    series: dict[str, list[Path]] = {}
+    for path in sorted(topic_directory.iterdir()):
+        if path.suffix in (".ndjson", ".avro"):
+            series.setdefault(path.stem.rsplit("-", 1)[0], []).append(path)
+
+    return heapq.merge(*(_read_series(paths) for paths in series.values()), key=lambda event: event.timestamp)
+
+
+def read_recording(directory: Path, topics: Optional[set[str]] = None) -> Iterator[RecordedEvent]:
+    """Yields the recorded events of every topic under directory ordered by timestamp"""
+    topic_directories = [
+        path for path in sorted(directory.iterdir())
+        if path.is_dir() and (topics is None or path.name in topics)
+    ]
+    logger.info("Replaying %d topics from %s", len(topic_directories), directory)
+    return heapq.merge(*(read_topic(path) for path in topic_directories), key=lambda event: event.timestamp)
+
+
+class Replay:
+    """Produces recorded events to the topics they were recorded from"""
+
+    def __init__(self, speed: float = 1.0, rebase_timestamps: bool = False):
+        """speed divides the time between events, math.inf produces them as fast as possible. When
+        rebase_timestamps is set, the keys are shifted so the first event is keyed with the current
+        time"""
+        self.speed = speed
+        self.rebase_timestamps = rebase_timestamps
+        self.producers: dict[str, Producer] = {}
+        self.partitioners: dict[str, partitioning.Partitioner] = {}
+        self.produced = 0
+
+    def _producer(self, event: RecordedEvent) -> Producer:
+        producer = self.producers.get(event.topic)
+        if producer is None:
+            _, _, num_partitions = topic_settings(event.topic, event.value)
+            self.partitioners[event.topic] = partitioning.get_partitioner(
+                event.topic, partition_strategy(event.topic), num_partitions
+            )
+            producer = Producer(
+                event.topic,
+                key_schema=event.key_schema,
+                value_schema=event.value_schema,
+                num_partitions=num_partitions,
+                num_replicas=1,
+                broker_properties=REPLAY_BROKER_PROPERTIES
+            )
+            Producer.provision_topics()
+            self.producers[event.topic] = producer
+        return producer
+
+    def run(self, events: Iterator[RecordedEvent]):
+        """Produces the events, waiting between them according to the speed"""
+        first_timestamp = None
+        offset = 0
+        start = time.monotonic()
+
+        for event in events:
+            if first_timestamp is None:
+                first_timestamp = event.timestamp
+                offset = int(time.time() * 1000) - first_timestamp if self.rebase_timestamps else 0
+
+            producer = self._producer(event)
+
+            if not math.isinf(self.speed):
+                # Serve delivery reports while waiting for the event to be due
+                due = start + (event.timestamp - first_timestamp) / 1000.0 / self.speed
+                while (remaining := due - time.monotonic()) > 0:
+                    producer.producer.poll(remaining)
+
+            key = {**event.key, "timestamp": event.timestamp + offset} if offset else event.key
+            # Partitioned with the strategy of the topic, like the models do
+            partition = self.partitioners[event.topic].partition(event.value)
+            partition_kwargs = {} if partition is None else {"partition": partition}
+            producer.producer.produce(
+                topic=event.topic,
+                key=key,
+                value=event.value,
+                key_schema=event.key_schema,
+                value_schema=event.value_schema,
+                **partition_kwargs
+            )
+
+            self.produced += 1
+            if self.produced % SERVICE_INTERVAL == 0:
+                ProducerRegistry.service()
+                logger.debug("Replayed %d events, at %d", self.produced, event.timestamp)
+
+    def close(self):
+        for producer in self.producers.values():
+            producer.close()
+
+
+def _parse_speed(speed: str) -> float:
+    return math.inf if speed == "max" else float(speed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays recorded events into Kafka")
+    parser.add_argument(
+        "directory",
+        type=Path,
+        nargs="?",
+        default=Path(environ.get("PRODUCER_SINK_DIR") or "output"),
+        help="Directory with the events recorded by the avro or ndjson sinks"
+    )
+    parser.add_argument(
+        "--speed",
+        type=_parse_speed,
+        default=_parse_speed(environ.get("REPLAY_SPEED") or "1"),
+        help="Speed multiplier of the replay, or 'max' to replay as fast as the broker accepts"
+    )
+    parser.add_argument(
+        "--topic",
+        action="append",
+        dest="topics",
+        help="Only replay the given topic. Can be repeated"
+    )
+    parser.add_argument(
+        "--rebase-timestamps",
+        action="store_true",
+        help="Shift the event keys so the first event is keyed with the current time"
+    )
+    args = parser.parse_args()
+
+    # The recording is replayed into Kafka, whatever sink the simulation is configured with
+    ProducerRegistry.sink_type = "kafka"
+
+    replay = Replay(speed=args.speed, rebase_timestamps=args.rebase_timestamps)
+    started = time.monotonic()
+    try:
+        replay.run(read_recording(args.directory, set(args.topics) if args.topics else None))
+    except KeyboardInterrupt:
+        logger.info("Shutting down")
+    finally:
+        replay.close()
+        elapsed = time.monotonic() - started
+        logger.info(
+            "Replayed %d events in %.1fs (%.0f events/s)",
+            replay.produced, elapsed, replay.produced / max(elapsed, 1e-9)
+        )
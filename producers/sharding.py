@@ -0,0 +1,242 @@
+"""Runs the train lines of the simulation across several worker processes.
+
+Lines are assigned whole to the workers when there are at most as many workers as lines. With more
+workers than lines, the turnstiles of each line are split into contiguous groups of stations, and the
+trains of the line run in the worker owning its first group. The parent process drives every worker
+in lockstep: a tick is only complete once every worker has finished it.
+"""
+import logging
+import multiprocessing
+import signal
+import time
+import traceback
+
+from collections import Counter
+from pathlib import Path
+from typing import NamedTuple, Optional, TYPE_CHECKING
+
+from models.network_data import load_network_data
+
+
+if TYPE_CHECKING:
+    from datetime import datetime, timedelta
+    from multiprocessing.connection import Connection
+
+
+logger = logging.getLogger(__name__)
+
+
+class LineShard(NamedTuple):
+    """A range of stations of a line whose turnstiles are run by a worker. num_trains is 0 unless the
+    worker also runs the trains of the line"""
+    color_name: str
+    start: int
+    stop: int
+    num_trains: int
+
+
+def plan_shards(line_sizes: dict[str, int], num_workers: int, num_trains: int) -> list[list[LineShard]]:
+    """Splits the lines, given as color name -> number of stations, across the workers"""
+    if num_workers <= len(line_sizes):
+        # Assign whole lines, biggest first, to the least loaded worker
+        workers: list[list[LineShard]] = [[] for _ in range(num_workers)]
+        loads = [0] * num_workers
+        for color_name, size in sorted(line_sizes.items(), key=lambda item: item[1], reverse=True):
+            worker = loads.index(min(loads))
+            workers[worker].append(LineShard(color_name, 0, size, num_trains))
+            loads[worker] += size
+        return [shards for shards in workers if shards]
+
+    # Give every line a number of station groups proportional to its size, at least one each
+    total_size = sum(line_sizes.values())
+    groups = {
+        color_name: max(1, (size * num_workers) // total_size) for color_name, size in line_sizes.items()
+    }
+    while sum(groups.values()) < num_workers:
+        color_name = max(groups, key=lambda name: line_sizes[name] / groups[name])
+        groups[color_name] += 1
+    while sum(groups.values()) > num_workers:
+        color_name = max((name for name in groups if groups[name] > 1), key=lambda name: groups[name])
+        groups[color_name] -= 1
+
+    workers = []
+    for color_name, size in line_sizes.items():
+        num_groups = min(groups[color_name], size)
+        for group in range(num_groups):
+            workers.append([
+                LineShard(
+                    color_name,
+                    (size * group) // num_groups,
+                    (size * (group + 1)) // num_groups,
+                    num_trains if group == 0 else 0
+                )
+            ])
+    return workers
+
+
+def _worker_main(
+    conn: "Connection",
+    shards: list[LineShard],
+    data_dir: Optional[Path],
+    seed: Optional[int],
+    start_time: Optional["datetime"]
+):
+    """Builds the lines of the shards and runs them every time the parent sends a tick. start_time
+    is set on the virtual clock before the lines emit the initial arrivals of their trains"""
+    # The parent coordinates the shutdown
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from models import Line
+    from models.common import clock
+    from models.producer import Producer
+    from models.producer_registry import ProducerRegistry
+    from models.turnstile_hardware import TurnstileHardware
+
+    lines = []
+    try:
+        network_data = load_network_data(data_dir)
+        Line.use_colors(network_data.lines)
+        TurnstileHardware.use_network(network_data)
+        TurnstileHardware.set_seed(seed)
+        if start_time is not None:
+            clock.set_time(start_time)
+        lines = [
+            Line(
+                Line.colors[shard.color_name],
+                network_data.lines[shard.color_name],
+                shard.num_trains,
+                (shard.start, shard.stop),
+                with_trains=False
+            )
+            for shard in shards
+        ]
+        # Before the initial arrivals, so the station topics get their partitions
+        Producer.provision_topics()
+        _ = [line.place_trains() for line in lines]
+        conn.send(("ready", None))
+
+        while True:
+            command, payload = conn.recv()
+
+            if command == "stop":
+                break
+            if command == "stats":
+                conn.send(("stats", {topic: stats.produced for topic, stats in ProducerRegistry.stats().items()}))
+                continue
+
+            curr_time, time_step, virtual_clock = payload
+            start = time.perf_counter()
+            if virtual_clock:
+                clock.set_time(curr_time)
+            _ = [line.run(curr_time, time_step) for line in lines]
+            ProducerRegistry.service()
+            conn.send(("done", time.perf_counter() - start))
+    except Exception:
+        conn.send(("error", traceback.format_exc()))
+    finally:
+        _ = [line.close() for line in lines]
+        try:
+            conn.send(("closed", None))
+        except (BrokenPipeError, OSError):
+            pass
+        conn.close()
+
+
+class ShardedLines:
+    """Drives the lines of the simulation in worker processes. It is used like a Line"""
+
+    def __init__(
+        self,
+        data_dir: Optional[Path],
+        num_workers: int,
+        num_trains: int = 10,
+        seed: Optional[int] = None,
+        virtual_clock: bool = False,
+        start_time: Optional["datetime"] = None,
+        shutdown_timeout: float = 30.0
+    ):
+        """Starts the workers, which load the network of data_dir (see network_data.py). With
+        virtual_clock, the workers key their initial arrivals with start_time"""
+        self.virtual_clock = virtual_clock
+        self.shutdown_timeout = shutdown_timeout
+
+        network_data = load_network_data(data_dir)
+        line_sizes = {color_name: len(stations) for color_name, stations in network_data.lines.items()}
+        self.shards = plan_shards(line_sizes, num_workers, num_trains)
+
+        # Forking after librdkafka started its threads is unsafe, so workers start from scratch
+        context = multiprocessing.get_context("spawn")
+        self.workers = []
+        for index, shards in enumerate(self.shards):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(
+                target=_worker_main,
+                args=(
+                    child_conn,
+                    shards,
+                    data_dir,
+                    seed,
+                    start_time if virtual_clock else None
+                ),
+                name=f"simulation-worker-{index}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            self.workers.append((process, parent_conn))
+            logger.info("Started %s with shards %s", process.name, shards)
+
+        self._gather("ready")
+
+    def _gather(self, expected: str) -> list:
+        """Waits for every worker to answer. This is the barrier between ticks"""
+        results = []
+        for process, conn in self.workers:
+            command, payload = conn.recv()
+            if command != expected:
+                raise RuntimeError(f"{process.name} failed: {payload}")
+            results.append(payload)
+        return results
+
+    def run(self, timestamp: "datetime", time_step: "timedelta"):
+        """Runs a tick on every worker and waits for all of them to finish it"""
+        for _, conn in self.workers:
+            conn.send(("tick", (timestamp, time_step, self.virtual_clock)))
+        durations = self._gather("done")
+        logger.debug("tick %s done. slowest worker: %.3fs", timestamp.isoformat(), max(durations))
+
+    def produced(self) -> dict[str, int]:
+        """Returns the events produced by the workers so far, per topic"""
+        for _, conn in self.workers:
+            conn.send(("stats", None))
+        produced = Counter()
+        for worker_produced in self._gather("stats"):
+            produced.update(worker_produced)
+        return dict(produced)
+
+    def close(self):
+        """Stops the workers, giving them shutdown_timeout seconds to flush their producers"""
+        for process, conn in self.workers:
+            try:
+                conn.send(("stop", None))
+            except (BrokenPipeError, OSError):
+                logger.warning("%s is no longer running", process.name)
+
+        deadline = time.monotonic() + self.shutdown_timeout
+        for process, conn in self.workers:
+            try:
+                while conn.poll(max(0.0, deadline - time.monotonic())):
+                    command, payload = conn.recv()
+                    if command == "closed":
+                        break
+                    if command == "error":
+                        logger.error("%s failed: %s", process.name, payload)
+            except EOFError:
+                pass
+
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("%s did not stop in time, terminating it", process.name)
+                process.terminate()
+                process.join()
+            conn.close()
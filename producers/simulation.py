@@ -1,40 +1,88 @@
 """Defines a time simulation responsible for executing any registered
 producers
 """
+import argparse
 import datetime
+import math
 import time
 from enum import IntEnum
 import logging
 import logging.config
+from os import environ
 from pathlib import Path
 
-import pandas as pd
-
 # Import logging before models to ensure configuration is picked up
 logging.config.fileConfig(f"{Path(__file__).parents[0]}/logging.ini")
 
+from bootstrap_stations import bootstrap_stations
 from connector import configure_connector
 from models import Line, Weather
+from models.common import clock
+from models.network_data import load_network_data
+from models.producer import Producer
+from models.producer_registry import ProducerRegistry
+from models.turnstile_hardware import TurnstileHardware
+from sharding import ShardedLines
 
 
 logger = logging.getLogger(__name__)
 
 
+# How the station reference data gets to Kafka: "connector" configures the JDBC source connector,
+# which reads the Postgres table, and "bootstrap" produces the CSV rows directly (see
+# bootstrap_stations.py)
+STATIONS_SOURCE = environ.get("STATIONS_SOURCE") or "connector"
+
+
 class TimeSimulation:
     weekdays = IntEnum("weekdays", "mon tue wed thu fri sat sun", start=0)
     ten_min_frequency = datetime.timedelta(minutes=10)
 
-    def __init__(self, sleep_seconds=5, time_step=None, schedule=None):
-        """Initializes the time simulation"""
+    def __init__(
+        self,
+        sleep_seconds=5,
+        time_step=None,
+        schedule=None,
+        speed=1.0,
+        virtual_clock=False,
+        start_time=None,
+        duration=None,
+        seed=None,
+        num_trains=10,
+        workers=1,
+        data_dir=None
+    ):
+        """Initializes the time simulation
+
+        speed divides the time slept between steps, math.inf runs the steps as fast as possible.
+        When virtual_clock is set, events are keyed with the simulated time instead of the
+        wall-clock. duration is the simulated time after which the simulation stops. seed makes the
+        turnstile and weather randomness reproducible; together with virtual_clock and start_time,
+        identical seeds produce identical event sequences. num_trains is the number of trains per
+        line. With more than one worker, the lines run in that many processes (see sharding.py).
+        data_dir is the directory with the network CSV files, producers/data by default.
+        """
         self.sleep_seconds = sleep_seconds
         self.time_step = time_step
         if self.time_step is None:
             self.time_step = datetime.timedelta(minutes=self.sleep_seconds)
+        self.speed = speed
+        self.virtual_clock = virtual_clock
+        self.start_time = start_time or datetime.datetime.utcnow().replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        self.duration = duration
+        self.seed = seed
+        self.data_dir = data_dir
 
-        # Read data from disk
-        self.raw_df = pd.read_csv(
-            f"{Path(__file__).parents[0]}/data/cta_stations.csv"
-        ).sort_values("order")
+        # Read data from disk, or from the cache of a previous start
+        self.network_data = load_network_data(data_dir)
+        Line.use_colors(self.network_data.lines)
+        TurnstileHardware.use_network(self.network_data)
+        TurnstileHardware.set_seed(seed)
+        # Lines emit the initial arrivals of their trains when they are placed
+        if self.virtual_clock:
+            clock.set_time(self.start_time)
 
         # Define the train schedule (same for all trains)
         self.schedule = schedule
@@ -49,35 +97,139 @@ class TimeSimulation:
                 TimeSimulation.weekdays.sun: {0: TimeSimulation.ten_min_frequency},
             }
 
-        self.train_lines = [
-            Line(Line.colors.blue, self.raw_df[self.raw_df["blue"]]),
-            Line(Line.colors.red, self.raw_df[self.raw_df["red"]]),
-            Line(Line.colors.green, self.raw_df[self.raw_df["green"]]),
-        ]
+        if workers > 1:
+            self.train_lines = [
+                ShardedLines(
+                    data_dir,
+                    workers,
+                    num_trains=num_trains,
+                    seed=seed,
+                    virtual_clock=virtual_clock,
+                    start_time=self.start_time
+                )
+            ]
+        else:
+            self.train_lines = [
+                Line(color, self.network_data.lines[color.name], num_trains, with_trains=False)
+                for color in Line.colors
+            ]
+            # The station topics have to exist before the initial arrivals are produced, or the
+            # broker creates them with its default number of partitions
+            Producer.provision_topics()
+            _ = [line.place_trains() for line in self.train_lines]
 
     def run(self):
-        curr_time = datetime.datetime.utcnow().replace(
-            hour=0, minute=0, second=0, microsecond=0
-        )
+        curr_time = self.start_time
+        end_time = curr_time + self.duration if self.duration is not None else None
+        step_seconds = self.sleep_seconds / self.speed
         logger.info("Beginning simulation, press Ctrl+C to exit at any time")
-        logger.info("loading kafka connect jdbc source connector")
-        configure_connector()
+        if ProducerRegistry.sink_type == "kafka":
+            if STATIONS_SOURCE == "bootstrap":
+                logger.info("bootstrapping stations")
+                bootstrap_stations(self.data_dir)
+            else:
+                logger.info("loading kafka connect jdbc source connector")
+                configure_connector()
 
         logger.info("beginning cta train simulation")
-        weather = Weather(curr_time.month)
+        weather = Weather(curr_time.month, seed=self.seed)
+
+        # The station and turnstile topics were provisioned before the trains were placed, the
+        # weather topic is registered by now
+        logger.info("provisioning kafka topics")
+        Producer.provision_topics()
+
         try:
-            while True:
+            next_step = time.monotonic()
+            while end_time is None or curr_time < end_time:
                 logger.debug("simulation running: %s", curr_time.isoformat())
+                if self.virtual_clock:
+                    clock.set_time(curr_time)
                 # Send weather on the top of the hour
                 if curr_time.minute == 0:
                     weather.run(curr_time.month)
+                    for topic, stats in sorted(ProducerRegistry.stats().items()):
+                        logger.debug("topic: %s, %s", topic, stats)
                 _ = [line.run(curr_time, self.time_step) for line in self.train_lines]
+                # Serve delivery reports, holding the tick back if the producer queue is too full
+                ProducerRegistry.service()
                 curr_time = curr_time + self.time_step
-                time.sleep(self.sleep_seconds)
+
+                # Sleep what is left of the step so slow steps do not push the simulation behind
+                next_step += step_seconds
+                remaining_seconds = next_step - time.monotonic()
+                if remaining_seconds > 0:
+                    time.sleep(remaining_seconds)
+                else:
+                    next_step = time.monotonic()
         except KeyboardInterrupt as e:
             logger.info("Shutting down")
+        finally:
             _ = [line.close() for line in self.train_lines]
+            weather.close()
+
+
+def _parse_speed(speed: str) -> float:
+    return math.inf if speed == "max" else float(speed)
 
 
 if __name__ == "__main__":
-    TimeSimulation().run()
+    parser = argparse.ArgumentParser(description="Runs the CTA train simulation")
+    parser.add_argument(
+        "--speed",
+        type=_parse_speed,
+        default=_parse_speed(environ.get("SIMULATION_SPEED") or "1"),
+        help="Speed multiplier of the simulation, or 'max' to run as fast as possible"
+    )
+    parser.add_argument(
+        "--virtual-clock",
+        action="store_true",
+        default=(environ.get("SIMULATION_VIRTUAL_CLOCK") or "false").lower() in ("1", "true", "yes"),
+        help="Key events with the simulated time instead of the wall-clock"
+    )
+    parser.add_argument(
+        "--start-time",
+        type=datetime.datetime.fromisoformat,
+        help="Simulated UTC start time (ISO 8601). Defaults to the start of the current day"
+    )
+    parser.add_argument(
+        "--duration-hours",
+        type=float,
+        help="Simulated hours after which the simulation stops. Runs until interrupted by default"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=int(environ["SIMULATION_SEED"]) if environ.get("SIMULATION_SEED") else None,
+        help="Seed of the simulation randomness, for reproducible runs"
+    )
+    parser.add_argument(
+        "--trains-per-line",
+        type=int,
+        default=int(environ.get("SIMULATION_TRAINS_PER_LINE") or "10"),
+        help="Number of trains running on each line"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=int(environ.get("SIMULATION_WORKERS") or "1"),
+        help="Number of processes the lines are sharded across"
+    )
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        default=environ.get("NETWORK_DATA_DIR"),
+        help="Directory with the station and ridership CSV files, such as a network written by generate_network.py"
+    )
+    args = parser.parse_args()
+
+    TimeSimulation(
+        speed=args.speed,
+        virtual_clock=args.virtual_clock,
+        start_time=args.start_time,
+        duration=datetime.timedelta(hours=args.duration_hours) if args.duration_hours is not None else None,
+        seed=args.seed,
+        num_trains=args.trains_per_line,
+        workers=args.workers,
+        data_dir=args.data_dir
+    ).run()